@@ -1,3 +1,4 @@
+import click
 import pandas as pd
 import requests
 import sentry_sdk
@@ -6,21 +7,27 @@ import xarray as xr
 from flask import Flask
 from sentry_sdk.integrations.flask import FlaskIntegration
 
-from climatedata_api.charts import generate_charts, generate_regional_charts
+from climatedata_api.charts import (generate_charts, generate_charts_batch,
+                                    generate_regional_charts)
 from climatedata_api.download import (download, download_30y, download_ahccd,
                                       download_regional_30y, download_s2d)
 from climatedata_api.geomet import get_geomet_collection_download_links
 from climatedata_api.map import (get_allowance_gridded_values,
                                  get_choro_values,
+                                 get_choro_values_periods,
                                  get_delta_30y_gridded_values,
+                                 get_delta_30y_gridded_values_batch,
                                  get_delta_30y_regional_values,
                                  get_slr_gridded_values,
                                  get_id_list_from_points,
+                                 get_id_list_from_points_post,
                                  get_s2d_release_date,
-                                 get_s2d_gridded_values)
+                                 get_s2d_gridded_values,
+                                 warm_choro_cache)
 from climatedata_api.siteinfo import (get_location_values)
 from climatedata_api.raster import get_raster_route
-from climatedata_api.utils import generate_kdtrees
+from climatedata_api.utils import (build_catalog, generate_kdtrees, rechunk_point_datasets,
+                                   refresh_dataset_index)
 
 pd.set_option('display.max_rows', 10000)
 xr.set_options(keep_attrs=True)
@@ -29,6 +36,10 @@ app = Flask(__name__)
 app.config.from_object('default_settings')
 app.config.from_envvar('CLIMATEDATA_FLASK_SETTINGS', silent=True)
 
+# index datasets at startup so that workers forked from the master share it
+with app.app_context():
+    refresh_dataset_index()
+
 if 'SENTRY_DSN' in app.config:
     sentry_sdk.init(
         app.config['SENTRY_DSN'],
@@ -39,18 +50,24 @@ if 'SENTRY_DSN' in app.config:
 # charts routes
 app.add_url_rule('/generate-charts/<lat>/<lon>/<var>/<month>', view_func=generate_charts)
 app.add_url_rule('/generate-charts/<lat>/<lon>/<var>', view_func=generate_charts)
+app.add_url_rule('/generate-charts-batch/<lat>/<lon>', view_func=generate_charts_batch)
 app.add_url_rule('/generate-regional-charts/<partition>/<index>/<var>/<month>', view_func=generate_regional_charts)
 app.add_url_rule('/generate-regional-charts/<partition>/<index>/<var>', view_func=generate_regional_charts)
 
 # map routes
 app.add_url_rule('/get-choro-values/<partition>/<var>/<scenario>/<month>/', view_func=get_choro_values)
 app.add_url_rule('/get-choro-values/<partition>/<var>/<scenario>', view_func=get_choro_values)
+app.add_url_rule('/get-choro-values-periods/<partition>/<var>/<scenario>/<month>/', view_func=get_choro_values_periods)
+app.add_url_rule('/get-choro-values-periods/<partition>/<var>/<scenario>', view_func=get_choro_values_periods)
 app.add_url_rule('/get-delta-30y-gridded-values/<lat>/<lon>/<var>/<month>', view_func=get_delta_30y_gridded_values)
+app.add_url_rule('/get-delta-30y-gridded-values-batch/<var>/<month>', view_func=get_delta_30y_gridded_values_batch,
+                 methods=['POST'])
 app.add_url_rule('/get-slr-gridded-values/<lat>/<lon>', view_func=get_slr_gridded_values)
 app.add_url_rule('/get-allowance-gridded-values/<lat>/<lon>', view_func=get_allowance_gridded_values)
 app.add_url_rule('/get-delta-30y-regional-values/<partition>/<index>/<var>/<month>',
                  view_func=get_delta_30y_regional_values)
 app.add_url_rule('/get-gids/<compressed_points>', view_func=get_id_list_from_points)
+app.add_url_rule('/get-gids', view_func=get_id_list_from_points_post, methods=['POST'])
 app.add_url_rule('/get-s2d-release-date/<var>/<freq>', view_func=get_s2d_release_date)
 app.add_url_rule('/get-s2d-gridded-values/<lat>/<lon>/<var>/<freq>', view_func=get_s2d_gridded_values)
 
@@ -98,5 +115,22 @@ def check_status():
 
 
 @app.cli.command("generate-kdtrees")
-def cli_generate_kdtrees():
-    generate_kdtrees()
+@click.option("--force", is_flag=True, help="Regenerate the grids whose shapefile did not change")
+def cli_generate_kdtrees(force):
+    generate_kdtrees(force)
+
+
+@app.cli.command("build-catalog")
+def cli_build_catalog():
+    build_catalog()
+
+
+@app.cli.command("rechunk-point-datasets")
+def cli_rechunk_point_datasets():
+    rechunk_point_datasets()
+
+
+@app.cli.command("warm-choro-cache")
+@click.option("--decimals", default=2, show_default=True, help="Number of decimals of the precomputed values")
+def cli_warm_choro_cache(decimals):
+    warm_choro_cache(decimals)
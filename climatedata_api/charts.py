@@ -1,82 +1,207 @@
+import copy
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import xarray as xr
 from flask import current_app as app
 from flask import request
-from werkzeug.exceptions import BadRequestKeyError
+from sentry_sdk import capture_exception
+from werkzeug.exceptions import BadRequestKeyError, HTTPException
 
-from climatedata_api.utils import (convert_time_series_dataset_to_dict,
+from climatedata_api.utils import (ResponseCache, check_coordinates, check_dataset_request,
+                                   convert_time_series_array_to_dict,
+                                   convert_time_series_array_to_list,
+                                   convert_time_series_dataset_to_dict,
                                    convert_time_series_dataset_to_list,
-                                   open_dataset, open_dataset_by_path)
+                                   convert_times_to_timestamps,
+                                   get_dataset_signature, get_grid_axis, get_grid_cell,
+                                   open_dataset, open_dataset_by_path, run_io_tasks,
+                                   select_month, select_nearest_point)
+
+# Charts returned by generate_charts, see CHART_CACHE_SIZE
+_charts_cache = ResponseCache('charts', 'CHART_CACHE_SIZE', 'CHART_CACHE_SPILL')
 
 
-def _format_slices_to_highcharts_series(observations_location_slice, bccaq_location_slice, delta_30y_slice, var, decimals, dataset_name):
+@functools.lru_cache(maxsize=None)
+def _get_chart_executor(max_workers):
     """
-    Format observations, bccaq and delta_30y slices to dictionary of series ready for highcharts
+    Thread pool shared by the requests of a worker to generate the charts of a batch, see generate_charts_batch.
+    Its threads read files through run_io_tasks, in the separate I/O thread pool.
     """
-    scenarios = app.config['SCENARIOS'][dataset_name]
-    delta_naming = app.config['DELTA_NAMING'][dataset_name]
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='charts')
 
-    if bccaq_location_slice[f'{scenarios[0]}_{var}_p50'].attrs.get('units') == 'K':
-        bccaq_location_slice = bccaq_location_slice + app.config['KELVIN_TO_C']
 
+class _CellSeries:
+    """
+    All the time series of a grid cell (or region), read at once into a 2-D array (variables x time).
+    Time steps where any variable is missing are dropped, like dataset.dropna('time').
+    """
+
+    def __init__(self, location_slice):
+        """
+        :param location_slice: dataset slice of a single cell, with a sorted time coordinate
+        """
+        times = location_slice.time.values
+        valid = np.ones(times.size, dtype=bool)
+        names = []
+        columns = []
+        for name, variable in location_slice.data_vars.items():
+            if 'time' not in variable.dims:
+                continue
+            data = variable.transpose('time', ...).values
+            if np.issubdtype(data.dtype, np.floating):
+                valid &= ~np.isnan(data.reshape(times.size, -1)).any(axis=1)
+            if variable.dims == ('time',):
+                names.append(name)
+                columns.append(data)
+
+        self.attrs = {name: location_slice[name].attrs for name in names}
+        self.rows = {name: i for i, name in enumerate(names)}
+        self.times = times[valid]
+        self.timestamps = convert_times_to_timestamps(self.times)
+        self._columns = [column[valid] for column in columns]
+        self.values = np.stack(self._columns) if columns else np.empty((0, self.times.size))
+
+    def __contains__(self, name):
+        return name in self.rows
+
+    def add(self, offset):
+        """
+        Return a copy with offset added to all values, computed in the dtype of each variable like dataset + offset
+        """
+        result = copy.copy(self)
+        result._columns = [column + offset for column in self._columns]
+        result.values = np.stack(result._columns) if self._columns else self.values
+        return result
+
+    def index(self, date, side='left'):
+        """
+        Return the index of a date in the time axis, see np.searchsorted
+        """
+        return int(np.searchsorted(self.times, np.datetime64(date), side=side))
+
+    def to_list(self, names, decimals, start=None, stop=None):
+        """
+        Return the time series of some variables as a list, see convert_time_series_dataset_to_list
+        """
+        return convert_time_series_array_to_list(self.timestamps[start:stop],
+                                                 self.values[[self.rows[name] for name in names], start:stop].T,
+                                                 decimals)
+
+    def to_dict(self, names, decimals, start=None, stop=None):
+        """
+        Return the time series of some variables as a dict, see convert_time_series_dataset_to_dict
+        """
+        return convert_time_series_array_to_dict(self.timestamps[start:stop],
+                                                 self.values[[self.rows[name] for name in names], start:stop].T,
+                                                 decimals)
+
+
+def _observations_30y_means(observations_location_slice):
+    """
+    Return the 30-year means of observations for the windows starting on years ending in 1 (1951-1980, 1961-1990, ...),
+    labelled with the start of the window.
+    Same values as rolling({'time': 30}).mean(), which uses bottleneck.move_mean (bottleneck is a requirement): the
+    running sums are computed with cumulative sums of the differences, in the dtype of the data, then multiplied by 1/30
+    (divided by 30 for the first window), as bottleneck does.
+    :param observations_location_slice: dataset slice with no missing values
+    :return: (timestamps, 2-D array of values (time x variables)), see convert_time_series_array_to_dict, or None if
+             the slice has missing values or other coordinates than time
+    """
+    variables = list(observations_location_slice.data_vars.values())
+    if set(observations_location_slice.coords) != {'time'} or any(
+            variable.dims != ('time',) or not np.issubdtype(variable.dtype, np.floating) or
+            variable.isnull().any() for variable in variables):
+        return None
+
+    times = observations_location_slice.time.values
+    years = times[:max(times.size - 29, 0)].astype('datetime64[Y]').astype(int) + 1970
+    starts = np.flatnonzero(years % 10 == 1)
+    values = np.empty((starts.size, len(variables)))
+    if starts.size:
+        for i, variable in enumerate(variables):
+            data = variable.values
+            window = data.dtype.type(30)
+            sums = np.cumsum(np.concatenate([np.cumsum(data[:30])[-1:], data[30:] - data[:-30]]))
+            means = sums * (data.dtype.type(1) / window)
+            means[0] = sums[0] / window
+            values[:, i] = means[starts]
+    return convert_times_to_timestamps(times[starts]), values
+
+
+def _format_observations_to_highcharts_series(observations_location_slice, var, decimals):
+    """
+    Format observations slice to the observations and 30y_observations series
+    """
     chart_series = {}
 
     if observations_location_slice and len(observations_location_slice.time) > 0:
         if observations_location_slice[var].attrs.get('units') == 'K':
             observations_location_slice = observations_location_slice + app.config['KELVIN_TO_C']
 
-        observations_location_slice_30y = observations_location_slice.rolling({'time': 30}).mean().dropna('time')
-        observations_location_slice_30y['time'] = observations_location_slice.time[0:len(observations_location_slice_30y.time)]
-        observations_location_slice_30y = observations_location_slice_30y.sel(time=(observations_location_slice_30y.time.dt.year % 10 == 1))
-
         chart_series['observations'] = convert_time_series_dataset_to_list(observations_location_slice, decimals)
-        chart_series['30y_observations'] = convert_time_series_dataset_to_dict(observations_location_slice_30y, decimals)
+        observations_30y_means = _observations_30y_means(observations_location_slice)
+        if observations_30y_means is not None:
+            chart_series['30y_observations'] = convert_time_series_array_to_dict(*observations_30y_means, decimals)
+        else:
+            observations_location_slice_30y = observations_location_slice.rolling({'time': 30}).mean().dropna('time')
+            observations_location_slice_30y['time'] = observations_location_slice.time[0:len(observations_location_slice_30y.time)]
+            observations_location_slice_30y = observations_location_slice_30y.sel(time=(observations_location_slice_30y.time.dt.year % 10 == 1))
+            chart_series['30y_observations'] = convert_time_series_dataset_to_dict(observations_location_slice_30y, decimals)
 
     else:
         chart_series['observations'] = []
         chart_series['30y_observations'] = []
 
+    return chart_series
+
+
+def _format_cells_to_highcharts_series(observations_location_slice, bccaq_cell, delta_30y_cell, var, decimals, dataset_name):
+    """
+    Format observations slice, bccaq and delta_30y cell series to dictionary of series ready for highcharts
+    """
+    scenarios = app.config['SCENARIOS'][dataset_name]
+    delta_naming = app.config['DELTA_NAMING'][dataset_name]
+
+    if bccaq_cell.attrs[f'{scenarios[0]}_{var}_p50'].get('units') == 'K':
+        bccaq_cell = bccaq_cell.add(app.config['KELVIN_TO_C'])
+
+    chart_series = _format_observations_to_highcharts_series(observations_location_slice, var, decimals)
+
     # we return the historical values for a single scenario before HISTORICAL_DATE_LIMIT
-    bccaq_location_slice_historical = bccaq_location_slice.where(
-        bccaq_location_slice.time <= np.datetime64(app.config['HISTORICAL_DATE_LIMIT_BEFORE'][dataset_name]), drop=True)
-    chart_series['modeled_historical_median'] = convert_time_series_dataset_to_list(
-        bccaq_location_slice_historical[f'{scenarios[0]}_{var}_p50'], decimals)
-    chart_series['modeled_historical_range'] = convert_time_series_dataset_to_list(
-        xr.merge([bccaq_location_slice_historical[f'{scenarios[0]}_{var}_p10'],
-                  bccaq_location_slice_historical[f'{scenarios[0]}_{var}_p90']]), decimals)
+    historical_stop = bccaq_cell.index(app.config['HISTORICAL_DATE_LIMIT_BEFORE'][dataset_name], side='right')
+    chart_series['modeled_historical_median'] = bccaq_cell.to_list(
+        [f'{scenarios[0]}_{var}_p50'], decimals, stop=historical_stop)
+    chart_series['modeled_historical_range'] = bccaq_cell.to_list(
+        [f'{scenarios[0]}_{var}_p10', f'{scenarios[0]}_{var}_p90'], decimals, stop=historical_stop)
 
     # For projection data, filter to only include values after the historical period (HISTORICAL_DATE_LIMIT)
-    bccaq_location_slice = bccaq_location_slice.where(
-        bccaq_location_slice.time >= np.datetime64(app.config['HISTORICAL_DATE_LIMIT_AFTER'][dataset_name]), drop=True)
+    projection_start = bccaq_cell.index(app.config['HISTORICAL_DATE_LIMIT_AFTER'][dataset_name])
 
     for scenario in scenarios:
         # Skip the scenario if it's not available for this variable
-        if f'{scenario}_{var}_p50' not in bccaq_location_slice:
+        if f'{scenario}_{var}_p50' not in bccaq_cell:
             continue
-        chart_series[scenario + '_median'] = convert_time_series_dataset_to_list(
-            bccaq_location_slice[f'{scenario}_{var}_p50'], decimals)
-        chart_series[scenario + '_range'] = convert_time_series_dataset_to_list(
-            xr.merge([bccaq_location_slice[f'{scenario}_{var}_p10'],
-                      bccaq_location_slice[f'{scenario}_{var}_p90']]), decimals)
-        chart_series[f"delta7100_{scenario}_median"] = convert_time_series_dataset_to_dict(
-            delta_30y_slice[f'{scenario}_{var}_{delta_naming}_p50'], decimals)
-        chart_series[f"delta7100_{scenario}_range"] = convert_time_series_dataset_to_dict(
-            xr.merge([delta_30y_slice[f'{scenario}_{var}_{delta_naming}_p10'],
-                      delta_30y_slice[f'{scenario}_{var}_{delta_naming}_p90']]), decimals)
-
-    if delta_30y_slice[f'{scenarios[0]}_{var}_p50'].attrs.get('units') == 'K':
-        delta_30y_slice = delta_30y_slice + app.config['KELVIN_TO_C']
+        chart_series[scenario + '_median'] = bccaq_cell.to_list(
+            [f'{scenario}_{var}_p50'], decimals, start=projection_start)
+        chart_series[scenario + '_range'] = bccaq_cell.to_list(
+            [f'{scenario}_{var}_p10', f'{scenario}_{var}_p90'], decimals, start=projection_start)
+        chart_series[f"delta7100_{scenario}_median"] = delta_30y_cell.to_dict(
+            [f'{scenario}_{var}_{delta_naming}_p50'], decimals)
+        chart_series[f"delta7100_{scenario}_range"] = delta_30y_cell.to_dict(
+            [f'{scenario}_{var}_{delta_naming}_p10', f'{scenario}_{var}_{delta_naming}_p90'], decimals)
+
+    if delta_30y_cell.attrs[f'{scenarios[0]}_{var}_p50'].get('units') == 'K':
+        delta_30y_cell = delta_30y_cell.add(app.config['KELVIN_TO_C'])
 
     for scenario in scenarios:
         # Skip the scenario if it's not available for this variable
-        if f'{scenario}_{var}_p50' not in delta_30y_slice:
+        if f'{scenario}_{var}_p50' not in delta_30y_cell:
             continue
-        chart_series[f"30y_{scenario}_median"] = convert_time_series_dataset_to_dict(
-            delta_30y_slice[f'{scenario}_{var}_p50'],
-            decimals)
-        chart_series[f"30y_{scenario}_range"] = convert_time_series_dataset_to_dict(
-            xr.merge([delta_30y_slice[f'{scenario}_{var}_p10'],
-                      delta_30y_slice[f'{scenario}_{var}_p90']]), decimals)
+        chart_series[f"30y_{scenario}_median"] = delta_30y_cell.to_dict([f'{scenario}_{var}_p50'], decimals)
+        chart_series[f"30y_{scenario}_range"] = delta_30y_cell.to_dict(
+            [f'{scenario}_{var}_p10', f'{scenario}_{var}_p90'], decimals)
 
     return chart_series
 
@@ -140,6 +265,16 @@ def _format_slices_to_highcharts_series_return_periods(observations_location_sli
     return chart_series
 
 
+def _load_slice(location_slice):
+    """
+    Read a location slice, dropping the missing time steps
+    :return: the loaded slice, or None if location_slice is None
+    """
+    if location_slice is None:
+        return None
+    return location_slice.dropna('time').load()
+
+
 def generate_charts(var, lat, lon, month='ann'):
     """
     Rewrite of get_values, generating a JSON ready for highcharts
@@ -149,8 +284,8 @@ def generate_charts(var, lat, lon, month='ann'):
     try:
         lati = float(lat)
         loni = float(lon)
-        monthpath, msys = app.config['MONTH_LUT'][month]
-        monthnumber = app.config['MONTH_NUMBER_LUT'][month]
+        if month not in app.config['MONTH_LUT'] or month not in app.config['MONTH_NUMBER_LUT']:
+            raise KeyError("Invalid month requested")
         decimals = int(request.args.get('decimals', 2))
         dataset_name = request.args.get('dataset_name', 'CMIP5').upper()
 
@@ -163,50 +298,158 @@ def generate_charts(var, lat, lon, month='ann'):
     except (ValueError, BadRequestKeyError, KeyError):
         return "Bad request", 400
 
+    return _generate_charts(var, lati, loni, month, decimals, dataset_name)
+
+
+def generate_charts_batch(lat, lon):
+    """
+    Generate the charts of several variables/months for a single location, see generate_charts.
+    Returns a dict of charts indexed by variable then month, a chart that can't be generated (bad request, missing
+    dataset or any other error) is replaced by {"error": message} without failing the other charts.
+    ex: curl 'http://localhost:5000/generate-charts-batch/60.31062731740045/-100.06347656250001?charts=tx_max:ann,prcptot:ann,frost_days:ann&dataset_name=CMIP6'
+    """
+    try:
+        lati = float(lat)
+        loni = float(lon)
+        decimals = int(request.args.get('decimals', 2))
+        dataset_name = request.args.get('dataset_name', 'CMIP5').upper()
+        charts = [tuple(chart.split(':')) for chart in request.args['charts'].split(',')]
+
+        if decimals < 0:
+            return "Bad request: invalid number of decimals", 400
+        if dataset_name not in app.config['FILENAME_FORMATS']:
+            raise KeyError("Invalid dataset requested")
+        for chart in charts:
+            if len(chart) != 2 or chart[0] not in app.config['VARIABLES'] or chart[1] not in app.config['MONTH_LUT'] \
+                    or chart[1] not in app.config['MONTH_NUMBER_LUT']:
+                raise ValueError(f"invalid chart {':'.join(chart)}")
+    except ValueError as e:
+        return f"Bad request: {e}", 400
+    except (BadRequestKeyError, KeyError):
+        return "Bad request", 400
+    check_coordinates(lati, loni)
+
+    # the grid cell of the location is resolved once per grid for all the charts
+    cells = {}
+    current_app = app._get_current_object()
+
+    def _generate(chart):
+        with current_app.app_context():
+            try:
+                result = _generate_charts(chart[0], lati, loni, chart[1], decimals, dataset_name, cells)
+            except HTTPException as e:
+                return {"error": f"Bad request: {e.description}"}
+            except Exception as ex:
+                capture_exception(ex)
+                return {"error": "Internal server error"}
+        if isinstance(result, tuple):  # error response of this chart only
+            return {"error": result[0].strip()}
+        return result
+
+    executor = _get_chart_executor(app.config['CHART_BATCH_WORKERS'])
+    charts_series = {}
+    for (var, month), result in zip(charts, executor.map(_generate, charts)):
+        charts_series.setdefault(var, {})[month] = result
+    return charts_series
+
+
+def _get_cell(dataset, lati, loni, cells):
+    """
+    Return the grid cell of a location in a dataset, resolved once per grid and stored in cells
+    """
+    key = (get_grid_axis(dataset['lat']), get_grid_axis(dataset['lon']))
+    if key not in cells:
+        cells[key] = get_grid_cell(dataset, lati, loni)
+    return cells[key]
+
+
+def _select_cell(dataset, lati, loni, cells):
+    """
+    Return the grid cell nearest to a location, same as select_nearest_point but using the cells already resolved
+    """
+    lat_index, lon_index = _get_cell(dataset, lati, loni, cells)
+    return dataset.isel(lat=lat_index, lon=lon_index)
+
+
+def _generate_charts(var, lati, loni, month, decimals, dataset_name, cells=None):
+    """
+    Generate the charts of a variable for a location, see generate_charts
+    :param cells: grid cells already resolved for this location, see _get_cell
+    """
+    monthpath, msys = app.config['MONTH_LUT'][month]
+    monthnumber = app.config['MONTH_NUMBER_LUT'][month]
+    if cells is None:
+        cells = {}
+
     # SPEI treatment is very different
     if var in app.config['SPEI_VARIABLES']:
         return generate_spei_charts(var, lati, loni, month, decimals)
 
     # so does sea level rise
     if var == 'slr':
-        return generate_slr_charts(lati, loni)
+        return generate_slr_charts(lati, loni, dataset_name)
 
     if var == 'allowance':
         if dataset_name != 'CMIP6':
             return f"Bad request : `allowance` variable only uses the CMIP6 dataset, and has no {dataset_name} data available.\n", 400
         return generate_allowance_charts(lati, loni)
 
+    try:
+        p50_var = f"{app.config['SCENARIOS'][dataset_name][0]}_{var}_p50"
+        check_dataset_request(dataset_name, '30ygraph', var, msys, monthpath, variables=[p50_var])
+        if not var.startswith('rl'):
+            check_dataset_request(dataset_name, 'allyears', var, msys, monthpath, variables=[p50_var])
+    except (ValueError, FileNotFoundError):
+        return "Bad request", 400
+
     try:
         observations_dataset = open_dataset(app.config['OBSERVATIONS_DATASET'][dataset_name],
-                                            'allyears', var, msys, monthpath)
-        observations_location_slice = observations_dataset.sel(lon=loni, lat=lati, method='nearest').drop(['lat', 'lon']).dropna(
-            'time')
-        observations_location_slice = observations_location_slice.sel(time=(observations_location_slice.time.dt.month == monthnumber))
+                                            'allyears', var, msys, monthpath, point_access=True)
     except FileNotFoundError:
         # observations doesn't exist for some variable, ex: HXMax
-        observations_location_slice = None
         observations_dataset = None
-
-    delta_30y_dataset = open_dataset(dataset_name, '30ygraph', var, msys, monthpath)
-    delta_30y_slice = delta_30y_dataset.sel(lon=loni, lat=lati, method='nearest').drop(
-        [i for i in delta_30y_dataset.coords if i != 'time']).dropna('time')
-
+    delta_30y_dataset = open_dataset(dataset_name, '30ygraph', var, msys, monthpath, point_access=True)
+    bccaq_dataset = None if var.startswith('rl') else open_dataset(dataset_name, 'allyears', var, msys, monthpath,
+                                                                   point_access=True)
+
+    # every location within the same grid cells gets the same chart
+    datasets = [dataset for dataset in [observations_dataset, delta_30y_dataset, bccaq_dataset] if dataset is not None]
+    cache_key = (dataset_name, var, month, decimals, tuple(_get_cell(dataset, lati, loni, cells) for dataset in datasets))
+    signature = tuple(get_dataset_signature(dataset) for dataset in datasets)
+    chart_series = _charts_cache.get(cache_key, signature)
+    if chart_series is not None:
+        return chart_series
+
+    if var.startswith('rl') and dataset_name != 'CMIP6':  # return period variables
+        return f"Bad request : return period variables only use the CMIP6 dataset, and has no {dataset_name} data available.\n", 400
+
+    # only the time steps of the requested month are read
+    observations_location_slice = None if observations_dataset is None else \
+        _select_cell(select_month(observations_dataset, monthnumber), lati, loni, cells).drop(['lat', 'lon'])
+    delta_30y_slice = _select_cell(delta_30y_dataset, lati, loni, cells).drop(
+        [i for i in delta_30y_dataset.coords if i != 'time'])
+
+    # the files are read concurrently
     if var.startswith('rl'):  # return period variables
-        if dataset_name != 'CMIP6':
-            return f"Bad request : return period variables only use the CMIP6 dataset, and has no {dataset_name} data available.\n", 400
+        observations_location_slice, delta_30y_slice = run_io_tasks(
+            lambda: _load_slice(observations_location_slice), lambda: _load_slice(delta_30y_slice))
         chart_series = _format_slices_to_highcharts_series_return_periods(
             observations_location_slice, delta_30y_slice, var, decimals, dataset_name)
     else:
-        bccaq_dataset = open_dataset(dataset_name, 'allyears', var, msys, monthpath)
-        bccaq_location_slice = bccaq_dataset.sel(lon=loni, lat=lati, method='nearest').drop(['lat', 'lon']).dropna('time')
-
-        chart_series = _format_slices_to_highcharts_series(observations_location_slice, bccaq_location_slice, delta_30y_slice,
-                                                           var, decimals, dataset_name)
+        bccaq_location_slice = _select_cell(bccaq_dataset, lati, loni, cells).drop(['lat', 'lon'])
+        observations_location_slice, bccaq_cell, delta_30y_cell = run_io_tasks(
+            lambda: _load_slice(observations_location_slice),
+            lambda: _CellSeries(bccaq_location_slice),
+            lambda: _CellSeries(delta_30y_slice))
+
+        chart_series = _format_cells_to_highcharts_series(observations_location_slice, bccaq_cell, delta_30y_cell,
+                                                          var, decimals, dataset_name)
         bccaq_dataset.close()
 
     if observations_dataset:
         observations_dataset.close()
     delta_30y_dataset.close()
+    _charts_cache.set(cache_key, signature, chart_series)
     return chart_series
 
 
@@ -224,12 +467,12 @@ def generate_spei_charts(var, lati, loni, month, decimals):
         app.config['NETCDF_SPEI_FILENAME_FORMATS'].format(root=app.config['DATASETS_ROOT'], var=var))
     observed_dataset = open_dataset_by_path(
         app.config['NETCDF_SPEI_OBSERVED_FILENAME_FORMATS'].format(root=app.config['DATASETS_ROOT'], var=var))
-    location_slice = dataset.sel(lon=loni, lat=lati, method='nearest').drop(['lat', 'lon', 'scale']).dropna('time')
-    location_slice = location_slice.sel(time=(location_slice.time.dt.month == monthnumber))
-
-    observed_location_slice = observed_dataset.sel(lon=loni, lat=lati, method='nearest').drop(
-        ['lat', 'lon', 'scale']).dropna('time')
-    observed_location_slice = observed_location_slice.sel(time=(observed_location_slice.time.dt.month == monthnumber))
+    # the files are read concurrently, only for the time steps of the requested month
+    location_slice, observed_location_slice = run_io_tasks(
+        lambda: _load_slice(select_nearest_point(select_month(dataset, monthnumber), lati, loni).drop(
+            ['lat', 'lon', 'scale'])),
+        lambda: _load_slice(select_nearest_point(select_month(observed_dataset, monthnumber), lati, loni).drop(
+            ['lat', 'lon', 'scale'])))
     observed_location_slice = observed_location_slice.where(
         observed_location_slice.time >= np.datetime64(app.config['SPEI_DATE_LIMIT']), drop=True)
     chart_series = {}
@@ -257,17 +500,15 @@ def generate_spei_charts(var, lati, loni, month, decimals):
     return chart_series
 
 
-def generate_slr_charts(lati, loni):
+def generate_slr_charts(lati, loni, dataset_name):
     """
         Copied from generate_spei_charts: no historical, no observations, single file
         ex: curl http://localhost:5000/generate-charts/58.031372421776396/-61.12792968750001/slr/ann
             curl http://localhost:5000/generate-charts/58.031372421776396/-61.12792968750001/slr/ann?dataset_name=CMIP6
+        :param dataset_name: dataset requested by the client, resolved in the request thread so that the charts can be
+            generated by the workers of generate_charts_batch
     """
-    try:
-        dataset_name = request.args.get('dataset_name', 'CMIP5').upper()
-        if dataset_name not in ['CMIP5', 'CMIP6']:
-            raise KeyError("Invalid dataset requested")
-    except KeyError:
+    if dataset_name not in ['CMIP5', 'CMIP6']:
         return "Bad request", 400
 
     if dataset_name == "CMIP5":
@@ -277,7 +518,7 @@ def generate_slr_charts(lati, loni):
         slr_path = app.config['NETCDF_SLR_CMIP6_PATH']
         low_p, high_p = "p17", "p83"
     dataset = open_dataset_by_path(slr_path.format(root=app.config['DATASETS_ROOT']))
-    location_slice = dataset.sel(lon=loni, lat=lati, method='nearest').drop(['lat', 'lon']).dropna('time')
+    location_slice = select_nearest_point(dataset, lati, loni).drop(['lat', 'lon']).dropna('time')
 
     chart_series = {}
 
@@ -291,7 +532,7 @@ def generate_slr_charts(lati, loni):
     if dataset_name == "CMIP5":
         dataset_enhanced = open_dataset_by_path(
             app.config['NETCDF_SLR_ENHANCED_PATH'].format(root=app.config['DATASETS_ROOT']))
-        enhanced_location_slice = dataset_enhanced.sel(lon=loni, lat=lati, method='nearest').drop(['lat', 'lon'])
+        enhanced_location_slice = select_nearest_point(dataset_enhanced, lati, loni).drop(['lat', 'lon'])
         chart_series['rcp85_enhanced'] = [[dataset_enhanced['time'].item() / 10 ** 6,
                                            round(enhanced_location_slice['enhanced_p50'].item(), 0)]]
     else:  # CMIP6
@@ -309,7 +550,7 @@ def generate_allowance_charts(lati, loni):
         ex: curl http://localhost:5000/generate-charts/58.031372421776396/-61.12792968750001/allowance/ann?dataset_name=CMIP6
     """
     dataset = open_dataset_by_path(app.config['NETCDF_ALLOWANCE_PATH'].format(root=app.config['DATASETS_ROOT']))
-    location_slice = dataset.sel(lon=loni, lat=lati, method='nearest').drop(['lat', 'lon']).dropna('time')
+    location_slice = select_nearest_point(dataset, lati, loni).drop(['lat', 'lon']).dropna('time')
 
     chart_series = {}
     for scenario in app.config['SCENARIOS']['CMIP6']:
@@ -339,43 +580,53 @@ def generate_regional_charts(partition, index, var, month='ann'):
         if dataset_name not in app.config['FILENAME_FORMATS']:
             raise KeyError("Invalid dataset requested")
 
-    except (ValueError, BadRequestKeyError, KeyError):
+        p50_var = f"{app.config['SCENARIOS'][dataset_name][0]}_{var}_p50"
+        check_dataset_request(dataset_name, '30ygraph', var, msys, partition=partition, variables=[p50_var])
+        if not var.startswith('rl'):
+            check_dataset_request(dataset_name, 'allyears', var, msys, partition=partition, variables=[p50_var])
+    except (ValueError, BadRequestKeyError, KeyError, FileNotFoundError):
         return "Bad request", 400
 
     try:
         observations_dataset = open_dataset(app.config['OBSERVATIONS_DATASET'][dataset_name],
                                             'allyears', var, msys, partition=partition)
         observations_location_slice = observations_dataset.sel(geom=indexi).drop(
-            [i for i in observations_dataset.coords if i != 'time']).dropna('time')
+            [i for i in observations_dataset.coords if i != 'time'])
     except FileNotFoundError:
         observations_dataset = None
         observations_location_slice = None
 
     delta_30y_dataset = open_dataset(dataset_name, '30ygraph', var, msys, partition=partition)
     delta_30y_slice = delta_30y_dataset.sel(geom=indexi).drop(
-        [i for i in delta_30y_dataset.coords if i != 'time']).dropna('time')
+        [i for i in delta_30y_dataset.coords if i != 'time'])
 
+    # the files are read concurrently
     if var.startswith('rl'):  # return period variables
         if dataset_name != 'CMIP6':
             return f"Bad request : return period variables only use the CMIP6 dataset, and has no {dataset_name} data available.\n", 400
+        observations_location_slice, delta_30y_slice = run_io_tasks(
+            lambda: _load_slice(observations_location_slice), lambda: _load_slice(delta_30y_slice))
         chart_series = _format_slices_to_highcharts_series_return_periods(
             observations_location_slice, delta_30y_slice, var, decimals, dataset_name)
     else:
         bccaq_dataset = open_dataset(dataset_name, 'allyears', var, msys, partition=partition)
         bccaq_location_slice = bccaq_dataset.sel(geom=indexi).drop(
-            [i for i in bccaq_dataset.coords if i != 'time']).dropna('time')
+            [i for i in bccaq_dataset.coords if i != 'time'])
 
-        # we filter the appropriate month/season from the MS or QS-DEC file
+        # we filter the appropriate month/season from the MS or QS-DEC file, before reading them
         if msys in ["MS", "QS-DEC"]:
-            bccaq_location_slice = bccaq_location_slice.sel(time=(bccaq_location_slice.time.dt.month == monthnumber))
-            if observations_location_slice:
-                observations_location_slice = observations_location_slice.sel(
-                    time=(observations_location_slice.time.dt.month == monthnumber))
-            delta_30y_slice = delta_30y_slice.sel(
-                time=(delta_30y_slice.time.dt.month == monthnumber))
-
-        chart_series = _format_slices_to_highcharts_series(observations_location_slice, bccaq_location_slice, delta_30y_slice,
-                                                           var, decimals, dataset_name)
+            bccaq_location_slice = select_month(bccaq_location_slice, monthnumber)
+            if observations_location_slice is not None:
+                observations_location_slice = select_month(observations_location_slice, monthnumber)
+            delta_30y_slice = select_month(delta_30y_slice, monthnumber)
+
+        observations_location_slice, bccaq_cell, delta_30y_cell = run_io_tasks(
+            lambda: _load_slice(observations_location_slice),
+            lambda: _CellSeries(bccaq_location_slice),
+            lambda: _CellSeries(delta_30y_slice))
+
+        chart_series = _format_cells_to_highcharts_series(observations_location_slice, bccaq_cell, delta_30y_cell,
+                                                          var, decimals, dataset_name)
         bccaq_dataset.close()
 
     if observations_dataset:
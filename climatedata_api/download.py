@@ -21,14 +21,19 @@ from flask import request, send_file
 from werkzeug.exceptions import BadRequestKeyError
 
 from climatedata_api.utils import (
+    check_dataset_request,
     format_metadata,
     make_zip,
     open_dataset,
     open_dataset_by_path,
     load_s2d_datasets_by_periods,
+    regrid_s2d_forecast,
+    get_points_mask,
     get_subset_by_bbox,
     get_subset_by_points,
     retrieve_s2d_release_date,
+    select_month,
+    select_nearest_point,
 )
 from default_settings import (
     DOWNLOAD_CSV_FORMAT,
@@ -60,7 +65,7 @@ def get_subset(dataset, point, adjust, limit=None):
         :return: a slice from the dataset
     """
     if len(point) == 2:
-        ds = dataset.sel(lat=point[0], lon=point[1], method='nearest').dropna('time')
+        ds = select_nearest_point(dataset, point[0], point[1]).dropna('time')
     elif len(point) == 4:
         ds = get_subset_by_bbox(dataset, point)
     else:
@@ -336,7 +341,7 @@ def download():
             app.config['NETCDF_SPEI_FILENAME_FORMATS'].format(root=app.config['DATASETS_ROOT'], var=var))]
         if month != 'all':
             monthnumber = app.config['MONTH_NUMBER_LUT'][month]
-            datasets[0] = datasets[0].sel(time=(datasets[0].time.dt.month == monthnumber))
+            datasets[0] = select_month(datasets[0], monthnumber)
         limit = app.config['SPEI_DATE_LIMIT']
     elif var.startswith('rl'):  # return period variables
         if dataset_name != 'CMIP6':
@@ -347,10 +352,16 @@ def download():
             return f"Bad request : `{var}` variable only supports the annual frequency, use the `ann` month parameter.\n", 400
         datasets = [open_dataset(dataset_name, dataset_type, var, freq, monthpath)]
     else:
+        try:
+            for m in (app.config['ALLMONTHS'] if month == 'all' else [monthpath]):
+                check_dataset_request(dataset_name, dataset_type, var, freq, m, variables=[f'{scenarios[0]}_{var}_p50'])
+        except (ValueError, FileNotFoundError) as e:
+            return f"Bad request: {str(e)}", 400
         if month == 'all':
-            datasets = [open_dataset(dataset_name, dataset_type, var, freq, m) for m in app.config['ALLMONTHS']]
+            datasets = [open_dataset(dataset_name, dataset_type, var, freq, m, point_access=bool(points))
+                        for m in app.config['ALLMONTHS']]
         else:
-            datasets = [open_dataset(dataset_name, dataset_type, var, freq, monthpath)]
+            datasets = [open_dataset(dataset_name, dataset_type, var, freq, monthpath, point_access=bool(points))]
 
     if var not in app.config['SPEI_VARIABLES'] and datasets[0][f'{scenarios[0]}_{var}_p50'].attrs.get('units') == 'K':
         adjust = app.config['KELVIN_TO_C']
@@ -470,11 +481,13 @@ def download_30y(var, lat, lon, month):
             raise ValueError
         if dataset_name not in app.config['FILENAME_FORMATS']:
             raise KeyError("Invalid dataset requested")
-    except (ValueError, BadRequestKeyError, KeyError):
+        check_dataset_request(dataset_name, '30ygraph', var, msys, month_path,
+                              variables=[f"{app.config['SCENARIOS'][dataset_name][0]}_{var}_p50"])
+    except (ValueError, BadRequestKeyError, KeyError, FileNotFoundError):
         return "Bad request", 400
 
-    delta_30y_dataset = open_dataset(dataset_name, '30ygraph', var, msys, month_path)
-    delta_30y_slice = delta_30y_dataset.sel(lon=loni, lat=lati, method='nearest').drop(['lat', 'lon']).dropna('time')
+    delta_30y_dataset = open_dataset(dataset_name, '30ygraph', var, msys, month_path, point_access=True)
+    delta_30y_slice = select_nearest_point(delta_30y_dataset, lati, loni).drop(['lat', 'lon']).dropna('time')
     csv_data = _format_30y_slice_to_csv(delta_30y_slice, var, decimals, dataset_name)
     delta_30y_dataset.close()
     return Response(csv_data, mimetype='text/csv', headers={"Content-disposition": f"attachment; filename={var}.csv"})
@@ -501,17 +514,19 @@ def download_regional_30y(partition, index, var, month):
             raise ValueError
         if dataset_name not in app.config['FILENAME_FORMATS']:
             raise KeyError("Invalid dataset requested")
-    except (ValueError, BadRequestKeyError, KeyError):
+        check_dataset_request(dataset_name, '30ygraph', var, msys, partition=partition,
+                              variables=[f"{app.config['SCENARIOS'][dataset_name][0]}_{var}_p50"])
+    except (ValueError, BadRequestKeyError, KeyError, FileNotFoundError):
         return "Bad request", 400
 
     delta_30y_dataset = open_dataset(dataset_name, '30ygraph', var, msys, partition=partition)
     delta_30y_slice = delta_30y_dataset.sel(geom=indexi).drop(
-        [i for i in delta_30y_dataset.coords if i != 'time']).dropna('time')
+        [i for i in delta_30y_dataset.coords if i != 'time'])
 
     # we filter the appropriate month/season from the MS or QS-DEC file
     if msys in ["MS", "QS-DEC"]:
-        delta_30y_slice = delta_30y_slice.sel(
-            time=(delta_30y_slice.time.dt.month == monthnumber))
+        delta_30y_slice = select_month(delta_30y_slice, monthnumber)
+    delta_30y_slice = delta_30y_slice.dropna('time')
 
     csv_data = _format_30y_slice_to_csv(delta_30y_slice, var, decimals, dataset_name)
     delta_30y_dataset.close()
@@ -780,13 +795,18 @@ def download_s2d():
     lat_attrs = forecast_slice['lat'].attrs
     lon_attrs = forecast_slice['lon'].attrs
 
-    # Regrid the forecast data according to the climatology data grid
-    # Use fill_value='extrapolate' to avoid NaNs when the climatology grid point is outside of the forecast grid
-    forecast_slice = forecast_slice.interp(lat=climatology_slice['lat'], method='nearest', kwargs={"fill_value": 'extrapolate'})
-    forecast_slice = forecast_slice.interp(lon=climatology_slice['lon'], method='nearest', kwargs={"fill_value": 'extrapolate'})
-
-    forecast_slice = get_subset_by_points(forecast_slice, points) if points else get_subset_by_bbox(forecast_slice, bbox)
-    climatology_slice = get_subset_by_points(climatology_slice, points) if points else get_subset_by_bbox(climatology_slice, bbox)
+    # Subset the climatology data first, then regrid the forecast data according to the climatology data grid only
+    # for the selected cells
+    # Climatology grid points outside of the forecast grid use the nearest forecast grid point, to avoid NaNs
+    if points:
+        used_lats, used_lons, mask = get_points_mask(climatology_slice, points)
+        forecast_slice = regrid_s2d_forecast(forecast_slice, climatology_slice, used_lats, used_lons).where(mask)
+        climatology_slice = climatology_slice.sel(lat=used_lats, lon=used_lons).where(mask)
+    else:
+        climatology_subset = get_subset_by_bbox(climatology_slice, bbox)
+        forecast_slice = regrid_s2d_forecast(forecast_slice, climatology_slice,
+                                             climatology_subset['lat'].values, climatology_subset['lon'].values)
+        climatology_slice = climatology_subset
     skill_slice = get_subset_by_points(skill_slice, points) if points else get_subset_by_bbox(skill_slice, bbox)
 
     # merge xarrays to have one merged dataset per period
@@ -1,5 +1,7 @@
 from datetime import datetime
+import itertools
 import json
+import struct
 
 from flask import Flask, Response
 from flask import current_app as app
@@ -7,13 +9,20 @@ from flask import request, send_file
 from werkzeug.exceptions import BadRequestKeyError
 
 from climatedata_api.utils import (
+    ResponseCache,
+    build_dataset_index,
+    check_dataset_request,
+    get_dataset_signature,
+    get_grid_axis,
+    get_grid_lookup,
     open_dataset,
     open_dataset_by_path,
     decode_compressed_points,
     load_s2d_datasets_by_periods,
     retrieve_s2d_release_date,
+    select_month,
+    select_nearest_point,
 )
-import pickle
 import numpy as np
 from sentry_sdk import capture_message
 
@@ -23,14 +32,32 @@ from default_settings import (
     S2D_SKILL_DATA_VAR_NAMES,
 )
 
+_choro_cache = ResponseCache('choro', 'CHORO_CACHE_SIZE', 'CHORO_CACHE_SPILL')
+
+
+def _get_output_format():
+    """
+    Return the output format requested with the format argument ('json' or 'bin'), or else with the Accept header
+    """
+    output_format = request.args.get('format')
+    if output_format is None:
+        output_format = 'bin' if request.accept_mimetypes.best_match(
+            ['application/json', 'application/octet-stream']) == 'application/octet-stream' else 'json'
+    return output_format
+
 
 def get_choro_values(partition, var, scenario, month='ann'):
     """
         Get regional data for all regions, single date
         ex: curl 'http://localhost:5000/get-choro-values/census/tx_max/rcp85/ann/?period=1971'
             curl 'http://localhost:5000/get-choro-values/census/tx_max/ssp585/ann/?period=2071&dataset_name=CMIP6&delta7100=true'
+        The values are returned as a JSON list, or in the binary format of _choro_values_to_bin with format=bin or
+        "Accept: application/octet-stream":
+            curl 'http://localhost:5000/get-choro-values/census/tx_max/rcp85/ann/?period=1971&format=bin'
     """
     try:
+        output_format = _get_output_format()
+        serialize, mimetype = _CHORO_FORMATS[output_format]
         msys = app.config['MONTH_LUT'][month][1]
         month_number = app.config['MONTH_NUMBER_LUT'][month]
         dataset_name = request.args.get('dataset_name', 'CMIP5').upper()
@@ -44,19 +71,138 @@ def get_choro_values(partition, var, scenario, month='ann'):
         period = int(request.args['period'])
         delta7100 = request.args.get('delta7100', 'false')
         decimals = int(request.args.get('decimals', 2))
-    except (TypeError, ValueError, BadRequestKeyError, KeyError):
+        delta = f"_{app.config['DELTA_NAMING'][dataset_name]}" if delta7100 == "true" else ""
+        check_dataset_request(dataset_name, '30ymeans', var, msys, partition=partition,
+                              variables=[f"{scenario}_{var}{delta}_p50"], times=[f"{period}-{month_number:02d}-01"])
+    except (TypeError, ValueError, BadRequestKeyError, KeyError, FileNotFoundError):
         return "Bad request", 400
 
-    delta = f"_{app.config['DELTA_NAMING'][dataset_name]}" if delta7100 == "true" else ""
+    bccaq_dataset = open_dataset(dataset_name, '30ymeans', var, msys, partition=partition)
+    cache_key = (dataset_name, partition, var, scenario, month, period, delta, decimals, output_format)
+    signature = get_dataset_signature(bccaq_dataset)
+    values = _choro_cache.get(cache_key, signature)
+    if values is None:
+        values = serialize(bccaq_dataset, f"{scenario}_{var}{delta}_p50", period, month_number, decimals)
+        _choro_cache.set(cache_key, signature, values)
+
+    # the format depends on the Accept header, caches must not serve one format to clients of the other
+    return Response(values, mimetype=mimetype, headers={'Vary': 'Accept'})
+
+
+def get_choro_values_periods(partition, var, scenario, month='ann'):
+    """
+        Get regional data for all regions and all periods, as a {"periods": [...], "values": [[...], ...]} object
+        where each row of values is the list returned by get-choro-values for the same period
+        ex: curl 'http://localhost:5000/get-choro-values-periods/census/tx_max/rcp85/ann/'
+            curl 'http://localhost:5000/get-choro-values-periods/census/tx_max/ssp585/ann/?dataset_name=CMIP6&delta7100=true'
+    """
+    try:
+        msys = app.config['MONTH_LUT'][month][1]
+        month_number = app.config['MONTH_NUMBER_LUT'][month]
+        dataset_name = request.args.get('dataset_name', 'CMIP5').upper()
+
+        if dataset_name not in app.config['FILENAME_FORMATS']:
+            raise KeyError("Invalid dataset requested")
+        if scenario not in app.config['SCENARIOS'][dataset_name]:
+            raise ValueError
+        if var not in app.config['VARIABLES']:
+            raise ValueError
+        delta7100 = request.args.get('delta7100', 'false')
+        decimals = int(request.args.get('decimals', 2))
+        delta = f"_{app.config['DELTA_NAMING'][dataset_name]}" if delta7100 == "true" else ""
+        check_dataset_request(dataset_name, '30ymeans', var, msys, partition=partition,
+                              variables=[f"{scenario}_{var}{delta}_p50"])
+    except (TypeError, ValueError, BadRequestKeyError, KeyError, FileNotFoundError):
+        return "Bad request", 400
 
     bccaq_dataset = open_dataset(dataset_name, '30ymeans', var, msys, partition=partition)
-    bccaq_time_slice = bccaq_dataset.sel(time=f"{period}-{month_number}-01")
+    cache_key = ('periods', dataset_name, partition, var, scenario, month, delta, decimals)
+    signature = get_dataset_signature(bccaq_dataset)
+    values = _choro_cache.get(cache_key, signature)
+    if values is None:
+        month_slice = select_month(bccaq_dataset, month_number)[f"{scenario}_{var}{delta}_p50"]
+        month_slice = month_slice.sel(time=(month_slice.time.dt.day == 1))
+        # one read of the whole (period x region) slice, rounded like the get-choro-values dataframes
+        matrix = np.round(month_slice.transpose('time', 'region').values.astype('float64'), decimals)
+        # only NaN is replaced, like fillna(0) in get-choro-values: nan_to_num would also clip infinities
+        values = json.dumps({'periods': month_slice.time.dt.year.values.tolist(),
+                             'values': np.where(np.isnan(matrix), 0, matrix).tolist()}).encode()
+        _choro_cache.set(cache_key, signature, values)
+
+    return Response(values, mimetype='application/json')
+
+
+def _choro_values_to_json(dataset, variable, period, month_number, decimals):
+    """
+    Serialize the values of all regions of a partition dataset at a single date
+    :param dataset: 30ymeans partition dataset
+    :param variable: name of the variable, ex: rcp85_tx_max_p50
+    :return: the JSON list of values, as bytes
+    """
+    time_slice = dataset.sel(time=f"{period}-{month_number}-01")
+    return json.dumps(time_slice[variable]
+                      .drop([i for i in time_slice.coords if i != 'region']).to_dataframe().astype('float64')
+                      .round(decimals).fillna(0).transpose().values.tolist()[0]).encode()
+
+
+def _choro_values_to_bin(dataset, variable, period, month_number, decimals):
+    """
+    Serialize the values of all regions of a partition dataset at a single date in a compact binary format, read by
+    clients with a Float32Array. All numbers are little-endian:
+        count (uint32): number of regions
+        nodata (float32): value of the regions without data (NaN)
+        scale (float32): precision the values were rounded to (10 ** -decimals)
+        values (count * float32): values of the regions, in the same order as the JSON list
+    :param dataset: 30ymeans partition dataset
+    :param variable: name of the variable, ex: rcp85_tx_max_p50
+    :return: the binary values, as bytes
+    """
+    values = dataset[variable].sel(time=f"{period}-{month_number}-01").values.reshape(-1)
+    values = np.round(values.astype('float64'), decimals).astype('<f4')
+    header = struct.pack('<Iff', values.size, np.nan, 10.0 ** -decimals)
+    return header + values.tobytes()
 
-    return Response(json.dumps(bccaq_time_slice[f"{scenario}_{var}{delta}_p50"]
-                               .drop([i for i in bccaq_time_slice.coords if i != 'region']).to_dataframe().astype(
-        'float64')
-        .round(decimals).fillna(0).transpose().values.tolist()[0]),
-        mimetype='application/json')
+
+_CHORO_FORMATS = {
+    'json': (_choro_values_to_json, 'application/json'),
+    'bin': (_choro_values_to_bin, 'application/octet-stream'),
+}
+
+
+def warm_choro_cache(decimals=2):
+    """
+    Precompute the get-choro-values responses of every partition, variable, scenario, month and period found in the
+    datasets and write them to the spill folder of the choropleth cache, where the workers will find them.
+    Responses whose dataset did not change since the last warm-up are skipped.
+    :param decimals: number of decimals of the precomputed responses
+    """
+    if not app.config['CHORO_CACHE_SPILL']:
+        print("CHORO_CACHE_SPILL is disabled, precomputed values would not be shared with the workers")
+        return
+
+    for (dataset_name, filetype, var, freq, _, partition), path in build_dataset_index().items():
+        if filetype != '30ymeans' or partition is None or dataset_name not in app.config['FILENAME_FORMATS']:
+            continue
+
+        print(f"Warming choropleth values of {path}")
+        dataset = open_dataset_by_path(path)
+        signature = get_dataset_signature(dataset)
+        times = dataset.time.dt
+        periods = [(month, month_number, period)
+                   for month, month_number in app.config['MONTH_NUMBER_LUT'].items()
+                   if app.config['MONTH_LUT'][month][1] == freq
+                   for period in times.year.values[(times.month.values == month_number) &
+                                                   (times.day.values == 1)].tolist()]
+        variables = [(scenario, delta) for scenario, delta in itertools.product(
+                         app.config['SCENARIOS'][dataset_name], ["", f"_{app.config['DELTA_NAMING'][dataset_name]}"])
+                     if f"{scenario}_{var}{delta}_p50" in dataset]
+
+        for (month, month_number, period), (scenario, delta), (output_format, (serialize, _)) in itertools.product(
+                periods, variables, _CHORO_FORMATS.items()):
+            cache_key = (dataset_name, partition, var, scenario, month, period, delta, decimals, output_format)
+            if _choro_cache.get(cache_key, signature) is None:
+                _choro_cache.persist(cache_key, signature,
+                                     serialize(dataset, f"{scenario}_{var}{delta}_p50", period, month_number, decimals))
 
 
 def _convert_delta30_values_to_dict(delta_30y_slice, var, delta, decimals, dataset_name, percentiles=['p10', 'p50', 'p90']):
@@ -70,18 +216,21 @@ def _convert_delta30_values_to_dict(delta_30y_slice, var, delta, decimals, datas
     """
 
     scenarios = app.config['SCENARIOS'][dataset_name]
+    # Skip the scenarios that are not available for this variable
+    available_scenarios = [scenario for scenario in scenarios
+                           if f"{scenario}_{var}{delta}_{percentiles[0]}" in delta_30y_slice]
+    names = [f"{scenario}_{var}{delta}_{p}" for scenario in available_scenarios for p in percentiles]
+
+    # read all the values in one pass instead of calling item() on each variable
+    values_slice = delta_30y_slice[names]
     if delta_30y_slice[f'{scenarios[0]}_{var}_p50'].attrs.get('units') == 'K' and not delta:
-        delta_30y_slice = delta_30y_slice + app.config['KELVIN_TO_C']
+        values_slice = values_slice + app.config['KELVIN_TO_C']
+    columns = [values_slice[name].values.reshape(-1) for name in names]
+    if any(column.size != 1 for column in columns):
+        raise ValueError("can only convert an array of size 1 to a Python scalar")
+    all_values = iter(np.concatenate(columns).tolist() if columns else [])
 
-    values = {}
-    for scenario in scenarios:
-        # Skip the scenario if it's not available for this variable
-        scenario_test_key = f"{scenario}_{var}{delta}_{percentiles[0]}"
-        if scenario_test_key not in delta_30y_slice:
-            continue
-        values[scenario] = {p: round(delta_30y_slice[f"{scenario}_{var}{delta}_{p}"].item(), decimals) for p in
-                            percentiles}
-    return values
+    return {scenario: {p: round(next(all_values), decimals) for p in percentiles} for scenario in available_scenarios}
 
 
 def get_delta_30y_gridded_values(lat, lon, var, month):
@@ -112,16 +261,104 @@ def get_delta_30y_gridded_values(lat, lon, var, month):
             raise ValueError
         if dataset_name not in app.config['FILENAME_FORMATS']:
             raise KeyError("Invalid dataset requested")
-    except (ValueError, BadRequestKeyError, KeyError):
+        check_dataset_request(dataset_name, '30ygraph', var, msys, period=monthpath,
+                              variables=[f"{app.config['SCENARIOS'][dataset_name][0]}_{var}_p50"],
+                              times=[f"{period}-{monthnumber:02d}-01"])
+    except (ValueError, BadRequestKeyError, KeyError, FileNotFoundError):
         return "Bad request", 400
 
     delta = f"_{app.config['DELTA_NAMING'][dataset_name]}" if delta7100 == "true" else ""
 
-    delta_30y_dataset = open_dataset(dataset_name, '30ygraph', var, msys, period=monthpath)
-    delta_30y_slice = delta_30y_dataset.sel(lon=loni, lat=lati, method='nearest').sel(time=f"{period}-{monthnumber}-01")
+    delta_30y_dataset = open_dataset(dataset_name, '30ygraph', var, msys, period=monthpath, point_access=True)
+    delta_30y_slice = select_nearest_point(delta_30y_dataset, lati, loni).sel(time=f"{period}-{monthnumber}-01")
     return _convert_delta30_values_to_dict(delta_30y_slice, var, delta, decimals, dataset_name)
 
 
+def get_delta_30y_gridded_values_batch(var, month):
+    """
+    Fetch specific data within the delta30y dataset for many points and periods, reading each grid row of the dataset once
+    ex: curl -X POST -H 'Content-Type: application/json' --data '{"points": [[60.31, -100.06], [45.5, -73.56]], "periods": [1951, 2071]}' 'http://localhost:5000/get-delta-30y-gridded-values-batch/tx_max/ann?decimals=2'
+        curl -X POST -H 'Content-Type: application/json' --data '{"points": [[60.31, -100.06]]}' 'http://localhost:5000/get-delta-30y-gridded-values-batch/tx_max/ann?dataset_name=CMIP6&delta7100=true'
+    The request body is a JSON object with a list of at most DOWNLOAD_POINTS_LIMIT [lat, lon] points and an optional list
+    of periods. All the periods of the dataset are returned when periods are not given.
+    :param var: climate variable name
+    :param month: [ann,jan,feb,...]
+    :return: for each point, a dictionary of the get-delta-30y-gridded-values results of each period
+    """
+    try:
+        monthpath, msys = app.config['MONTH_LUT'][month]
+        monthnumber = app.config['MONTH_NUMBER_LUT'][month]
+        body = request.get_json(silent=True)
+        points = np.array(body['points'], dtype='float64')
+        periods = body.get('periods')
+        if periods is not None:
+            periods = [int(period) for period in periods]
+        delta7100 = request.args.get('delta7100', 'false')
+        decimals = int(request.args.get('decimals', 2))
+        dataset_name = request.args.get('dataset_name', 'CMIP5').upper()
+
+        if decimals < 0:
+            return "Bad request: invalid number of decimals", 400
+        if var not in app.config['VARIABLES']:
+            raise ValueError
+        if dataset_name not in app.config['FILENAME_FORMATS']:
+            raise KeyError("Invalid dataset requested")
+        check_dataset_request(dataset_name, '30ygraph', var, msys, period=monthpath,
+                              variables=[f"{app.config['SCENARIOS'][dataset_name][0]}_{var}_p50"],
+                              times=[f"{period}-{monthnumber:02d}-01" for period in periods or []])
+    except (TypeError, ValueError, BadRequestKeyError, KeyError, FileNotFoundError):
+        return "Bad request", 400
+    if points.size == 0:
+        return []
+    if points.ndim != 2 or points.shape[1] != 2 or not np.isfinite(points).all():
+        return "Bad request: points must be a list of [lat, lon] numbers", 400
+    # Check if user abuses the API
+    if len(points) > app.config['DOWNLOAD_POINTS_LIMIT']:
+        return "Bad request: too many points requested", 400
+
+    delta = f"_{app.config['DELTA_NAMING'][dataset_name]}" if delta7100 == "true" else ""
+    percentiles = ['p10', 'p50', 'p90']
+
+    delta_30y_dataset = open_dataset(dataset_name, '30ygraph', var, msys, period=monthpath, point_access=True)
+    times = delta_30y_dataset.time
+    if periods is None:
+        time_indices = np.flatnonzero((times.dt.month.values == monthnumber) & (times.dt.day.values == 1))
+    else:
+        requested_times = np.array([f"{period}-{monthnumber:02d}-01" for period in periods], dtype='datetime64[ns]')
+        time_indices = np.minimum(np.searchsorted(times.values, requested_times), times.size - 1)
+        if not np.array_equal(times.values[time_indices], requested_times):
+            return "Bad request", 400
+    periods = times.dt.year.values[time_indices].tolist()
+
+    scenarios = app.config['SCENARIOS'][dataset_name]
+    # Skip the scenarios that are not available for this variable
+    available_scenarios = [scenario for scenario in scenarios
+                           if f"{scenario}_{var}{delta}_{percentiles[0]}" in delta_30y_dataset]
+    names = [f"{scenario}_{var}{delta}_{p}" for scenario in available_scenarios for p in percentiles]
+
+    lat_indices = get_grid_axis(delta_30y_dataset['lat']).nearest(points[:, 0])
+    lon_indices = get_grid_axis(delta_30y_dataset['lon']).nearest(points[:, 1])
+    variables = delta_30y_dataset[names].isel(time=time_indices)
+    # values are converted in float64 like the single values of get_delta_30y_gridded_values
+    values = np.empty((len(points), len(periods), len(names)), dtype='float64')
+    # The netcdf backend only supports outer indexing: the points are read one grid row at a time, so that only the
+    # requested cells are read instead of all the combinations of the requested lats and lons
+    for lat_index in np.unique(lat_indices):
+        row_points = np.flatnonzero(lat_indices == lat_index)
+        row_lon_indices, row_positions = np.unique(lon_indices[row_points], return_inverse=True)
+        row_slice = variables.isel(lat=lat_index, lon=row_lon_indices)
+        row_values = np.stack([row_slice[name].transpose('lon', 'time').values for name in names], axis=-1)
+        values[row_points] = row_values[row_positions]
+    if delta_30y_dataset[f'{scenarios[0]}_{var}_p50'].attrs.get('units') == 'K' and not delta:
+        values = values + app.config['KELVIN_TO_C']
+    values = values.reshape(len(points), len(periods), len(available_scenarios), len(percentiles)).tolist()
+
+    return [{period: {scenario: {p: round(value, decimals) for p, value in zip(percentiles, scenario_values)}
+                      for scenario, scenario_values in zip(available_scenarios, period_values)}
+             for period, period_values in zip(periods, point_values)}
+            for point_values in values]
+
+
 def get_slr_gridded_values(lat, lon):
     """
     Returns all values from sea-level change dataset for a requested location
@@ -143,12 +380,12 @@ def get_slr_gridded_values(lat, lon):
     slr_path = app.config['NETCDF_SLR_CMIP5_PATH'] if dataset_name == "CMIP5" else app.config['NETCDF_SLR_CMIP6_PATH']
 
     dataset = open_dataset_by_path(slr_path.format(root=app.config['DATASETS_ROOT']))
-    location_slice = dataset.sel(lon=loni, lat=lati, method='nearest').sel(time=f"{period}-01-01")
+    location_slice = select_nearest_point(dataset, lati, loni).sel(time=f"{period}-01-01")
 
     if dataset_name == "CMIP5":
         dataset_enhanced = open_dataset_by_path(
             app.config['NETCDF_SLR_ENHANCED_PATH'].format(root=app.config['DATASETS_ROOT']))
-        enhanced_location_slice = dataset_enhanced.sel(lon=loni, lat=lati, method='nearest')
+        enhanced_location_slice = select_nearest_point(dataset_enhanced, lati, loni)
 
         slr_values = _convert_delta30_values_to_dict(
             location_slice, 'slr', '', 0, 'CMIP5', percentiles=['p05', 'p50', 'p95'])
@@ -181,7 +418,7 @@ def get_allowance_gridded_values(lat, lon):
         return "Bad request", 400
 
     dataset = open_dataset_by_path(app.config['NETCDF_ALLOWANCE_PATH'].format(root=app.config['DATASETS_ROOT']))
-    location_slice = dataset.sel(lon=loni, lat=lati, method='nearest').sel(time=f"{period}-01-01")
+    location_slice = select_nearest_point(dataset, lati, loni).sel(time=f"{period}-01-01")
 
     allowance_values = _convert_delta30_values_to_dict(
         location_slice, 'allowance', "", 0, dataset_name, percentiles=['p50'])
@@ -216,8 +453,11 @@ def get_delta_30y_regional_values(partition, index, var, month):
             raise ValueError
         if dataset_name not in app.config['FILENAME_FORMATS']:
             raise KeyError("Invalid dataset requested")
+        check_dataset_request(dataset_name, '30ygraph', var, msys, partition=partition,
+                              variables=[f"{app.config['SCENARIOS'][dataset_name][0]}_{var}_p50"],
+                              times=[f"{period}-{monthnumber:02d}-01"])
 
-    except (ValueError, BadRequestKeyError, KeyError):
+    except (ValueError, BadRequestKeyError, KeyError, FileNotFoundError):
         return "Bad request", 400
 
     delta = f"_{app.config['DELTA_NAMING'][dataset_name]}" if delta7100 == "true" else ""
@@ -234,27 +474,63 @@ def get_id_list_from_points(compressed_points):
 
     """
     try:
-        gridname = request.args.get('gridname')
-        kdfile = app.config['CACHE_FOLDER'] / f"kdtree-{gridname}.pickle"
+        grid_lookup = get_grid_lookup(request.args.get('gridname'))
         points = decode_compressed_points(compressed_points)
 
-    except KeyError:
+    except (KeyError, ValueError):
         return "Bad request", 400
-    points_to_search = np.array(points)
 
-    with kdfile.open('rb') as f:
-        tree = pickle.load(f)
-    distances, gids = tree.query(points_to_search, distance_upper_bound=1.0)
+    return _lookup_gids(grid_lookup, points).tolist()
 
-    # verify that all points got a match. If a point doesn't have a match then there is a frontend issue, so we capture a message to Sentry
-    for dist in distances:
-        if dist == np.inf:
-            print("Unmatched point found")
-            capture_message(f"get_id_list_from_points: unmatched point found. Query is: {compressed_points}")
-            break
 
+def get_id_list_from_points_post():
+    """
+    Return feature unique id (gid) that matches all points posted in the request body, for selections too large for
+    the URL of get-gids. The body is the compressed list of points, or with "Content-Type: application/octet-stream",
+    little-endian float32 (lat, lon) pairs.
+    The gids are returned as a JSON list, or as little-endian int32 with format=bin or "Accept: application/octet-stream"
+    curl -X POST --data '-stivPu3IqgC0-J91gBs_RxxxCq8Dl5I41gBiv6Bv3ctqH75E16yBztY0vNt3KprlB70D' 'http://localhost:5000/get-gids?gridname=canadagrid'
+    """
+    try:
+        grid_lookup = get_grid_lookup(request.args.get('gridname'))
+        output_format = _get_output_format()
+        if output_format not in ['json', 'bin']:
+            raise ValueError("Invalid format")
+        if request.mimetype == 'application/octet-stream':
+            points = np.frombuffer(request.get_data(), dtype='<f4').reshape(-1, 2).astype('float64')
+            if not np.all(np.isfinite(points)):
+                raise ValueError("Invalid point")
+        else:
+            points = decode_compressed_points(request.get_data(as_text=True).strip())
+
+    except (KeyError, ValueError):
+        return "Bad request", 400
+
+    gids = _lookup_gids(grid_lookup, points)
+    if output_format == 'bin':
+        return Response(gids.astype('<i4').tobytes(), mimetype='application/octet-stream')
     return gids.tolist()
 
+
+def _lookup_gids(grid_lookup, points):
+    """
+    Return the gids of the cells nearest to points
+    """
+    gids, matched = grid_lookup.query(points, distance_upper_bound=1.0)
+
+    # verify that all points got a match. If a point doesn't have a match then there is a frontend issue, so we capture a message to Sentry
+    if not matched.all():
+        print("Unmatched point found")
+        # the message doesn't include the points so that the events are grouped, and large selections only send a few
+        # of their unmatched points
+        unmatched = points[~matched]
+        capture_message("get_id_list_from_points: unmatched point found",
+                        extras={"gridname": request.args.get('gridname'), "points_count": len(points),
+                                "unmatched_count": len(unmatched), "unmatched_points": unmatched[:5].tolist()})
+
+    return gids
+
+
 def get_s2d_release_date(var, freq):
     """
     Return the release date of the forecast data associated with a given variable and frequency
@@ -295,9 +571,9 @@ def get_s2d_gridded_values(lat, lon, var, freq):
     except (ValueError, FileNotFoundError) as e:
         return e, 400
 
-    forecast_slice = forecast_slice.sel(lon=longitude, lat=latitude, method='nearest')
-    climatology_slice = climatology_slice.sel(lon=longitude, lat=latitude, method='nearest')
-    skill_slice = skill_slice.sel(lon=longitude, lat=latitude, method='nearest')
+    forecast_slice = select_nearest_point(forecast_slice, latitude, longitude)
+    climatology_slice = select_nearest_point(climatology_slice, latitude, longitude)
+    skill_slice = select_nearest_point(skill_slice, latitude, longitude)
 
     values = {}
     for var_list, dataset in [
@@ -6,7 +6,7 @@ from flask import current_app as app
 from flask import request
 from werkzeug.exceptions import BadRequestKeyError
 
-from climatedata_api.utils import open_dataset
+from climatedata_api.utils import open_dataset, select_nearest_point
 
 
 def get_location_values(lat, lon):
@@ -26,16 +26,18 @@ def get_location_values(lat, lon):
 
     anusplin_ds = xr.open_dataset(
         app.config['DATASETS_ROOT'] / "locations" / "SearchLocation_30yAvg_anusplin_nrcan_canada_tg_mean_prcptot_YS.nc")
-    anusplin_slice = anusplin_ds.sel(lat=lati, lon=loni, method='nearest')
+    anusplin_slice = select_nearest_point(anusplin_ds, lati, loni)
 
     # return 404 when slice is empty to avoid "nan" in response
     if np.isnan(anusplin_slice.sel(time='1951-01-01').tg_mean.item()):
         return "Location not found", 404
 
-    tg_mean = open_dataset(dataset_name, '30ygraph', 'tg_mean', 'YS', '').sel(lat=lati, lon=loni, method='nearest')
+    tg_mean = select_nearest_point(open_dataset(dataset_name, '30ygraph', 'tg_mean', 'YS', '', point_access=True),
+                                   lati, loni)
     tg_mean_var = f"{scenario}_tg_mean_p50"
 
-    prcptot = open_dataset(dataset_name, '30ygraph', 'prcptot', 'YS', '').sel(lat=lati, lon=loni, method='nearest')
+    prcptot = select_nearest_point(open_dataset(dataset_name, '30ygraph', 'prcptot', 'YS', '', point_access=True),
+                                   lati, loni)
     prcptot_var = f"{scenario}_prcptot_p50"
     prcptot_delta_var = f"{scenario}_prcptot_{delta_naming}_p50"
     prcptot_reference = prcptot.sel(time='1971-01-01')[prcptot_var].item()
@@ -1,6 +1,18 @@
 import datetime
+import functools
+import glob
+import hashlib
 import io
-import math
+import json
+import os
+import re
+import string
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
 from typing import Tuple
 
 import xarray as xr
@@ -15,32 +27,157 @@ import zipfile
 from werkzeug.exceptions import BadRequest
 
 
-def open_dataset(dataset_name, filetype, var, freq, period=None, partition=None):
+def open_dataset(dataset_name, filetype, var, freq, period=None, partition=None, point_access=False):
     """
-    Open and return a xarray dataset. Try all path formats, since provided datasets had inconsistent naming convention
+    Open and return a xarray dataset. The path is resolved with the dataset index (see build_dataset_index), since
+    provided datasets had inconsistent naming convention
+    :param point_access: if True, the copy chunked for time series reads (see rechunk_point_datasets) is used when
+                         it is up to date
     :return: Dataset object
     """
-    if partition:
-        filename_formats = app.config['FILENAME_FORMATS'][dataset_name]['partitions'][filetype]
-    else:
-        filename_formats = app.config['FILENAME_FORMATS'][dataset_name][filetype]
+    dataset_path = get_dataset_path(dataset_name, filetype, var, freq, period, partition)
+    if dataset_path is None:
+        raise FileNotFoundError(
+            f"Dataset not found for {dataset_name}, {filetype}, {var}, {freq}, {period}, {partition}")
+    if point_access:
+        dataset_path = get_point_dataset_path(dataset_path)
+    return _get_cached_dataset(dataset_path)
 
-    # try all filename formats and return first found
-    for filename_format in filename_formats:
-        if partition:
-            dataset_path = app.config['DATASETS_ROOT'] / dataset_name / "partitions" / partition / var / freq \
-                           / filename_format.format(var=var, freq=freq, period=period)
-        else:
-            dataset_path = app.config['DATASETS_ROOT'] / dataset_name / filetype / var / freq \
-                           / filename_format.format(var=var, freq=freq, period=period)
 
-        if not dataset_path.exists():
+# Index of all datasets matching FILENAME_FORMATS: {(dataset_name, filetype, var, freq, period, partition): path}
+# period is None for filename formats that don't use it
+_dataset_index = {'root': None, 'built': 0, 'paths': {}}
+_dataset_index_lock = threading.Lock()
+# Held while the index is rebuilt, so that a single scan of DATASETS_ROOT runs at a time
+_dataset_index_build_lock = threading.Lock()
+
+
+def _filename_format_to_regex(filename_format, var, freq):
+    """
+    Convert a FILENAME_FORMATS template to a regex matching its filenames, capturing the period if used
+    """
+    pattern = ""
+    for literal, field, _, _ in string.Formatter().parse(filename_format):
+        pattern += re.escape(literal)
+        if field == 'var':
+            pattern += re.escape(var)
+        elif field == 'freq':
+            pattern += re.escape(freq)
+        elif field == 'period':
+            pattern += "(?P<period>.*)"
+    return re.compile(pattern)
+
+
+def _index_dataset_folder(paths, folder, filename_formats, key_prefix, partition):
+    """
+    Add all files of a {var}/{freq} folder tree to the dataset index.
+    When many filename formats match, the first one in FILENAME_FORMATS has priority.
+    """
+    for var_entry in os.scandir(folder):
+        if not var_entry.is_dir():
             continue
-        dataset = xr.open_dataset(dataset_path, decode_times=False)
-        dataset['time'] = xr.decode_cf(dataset).time
-        return dataset
+        for freq_entry in os.scandir(var_entry.path):
+            if not freq_entry.is_dir():
+                continue
+            var, freq = var_entry.name, freq_entry.name
+            filenames = sorted(entry.name for entry in os.scandir(freq_entry.path) if entry.is_file())
+            for filename_format in filename_formats:
+                regex = _filename_format_to_regex(filename_format, var, freq)
+                for filename in filenames:
+                    match = regex.fullmatch(filename)
+                    if not match:
+                        continue
+                    key = key_prefix + (var, freq, match.groupdict().get('period'), partition)
+                    paths.setdefault(key, Path(freq_entry.path) / filename)
 
-    raise FileNotFoundError(f"Dataset not found for {dataset_name}, {filetype}, {var}, {freq}, {period}, {partition}")
+
+def build_dataset_index():
+    """
+    Scan DATASETS_ROOT and return the index of the datasets matching FILENAME_FORMATS
+    """
+    root = app.config['DATASETS_ROOT']
+    paths = {}
+    for dataset_name, filetypes in app.config['FILENAME_FORMATS'].items():
+        for filetype, filename_formats in filetypes.items():
+            if filetype == 'partitions':
+                continue
+            folder = root / dataset_name / filetype
+            if folder.is_dir():
+                _index_dataset_folder(paths, folder, filename_formats, (dataset_name, filetype), None)
+
+        partitions_folder = root / dataset_name / "partitions"
+        if 'partitions' not in filetypes or not partitions_folder.is_dir():
+            continue
+        for partition_entry in os.scandir(partitions_folder):
+            if not partition_entry.is_dir():
+                continue
+            for filetype, filename_formats in filetypes['partitions'].items():
+                _index_dataset_folder(paths, partition_entry.path, filename_formats, (dataset_name, filetype),
+                                      partition_entry.name)
+    return paths
+
+
+def _rebuild_dataset_index():
+    """
+    Scan DATASETS_ROOT and replace the dataset index, the caller holds _dataset_index_build_lock
+    """
+    built = time.monotonic()
+    paths = build_dataset_index()
+    with _dataset_index_lock:
+        _dataset_index.update(root=app.config['DATASETS_ROOT'], built=built, paths=paths)
+
+
+def refresh_dataset_index():
+    """
+    Rebuild the dataset index, to be called when files are added to or removed from DATASETS_ROOT
+    """
+    with _dataset_index_build_lock:
+        _rebuild_dataset_index()
+
+
+def _refresh_dataset_index_in_background():
+    """
+    Rebuild the dataset index in a background thread, unless a rebuild is already running. Requests keep using the
+    previous index in the meantime.
+    """
+    if not _dataset_index_build_lock.acquire(blocking=False):
+        return
+    current_app = app._get_current_object()
+
+    def _refresh():
+        try:
+            with current_app.app_context():
+                _rebuild_dataset_index()
+        finally:
+            _dataset_index_build_lock.release()
+
+    try:
+        threading.Thread(target=_refresh, daemon=True).start()
+    except RuntimeError:
+        _dataset_index_build_lock.release()
+
+
+def get_dataset_path(dataset_name, filetype, var, freq, period=None, partition=None):
+    """
+    Return the path of a dataset from the dataset index, or None if it doesn't exist.
+    The index is built on first use and rebuilt in the background after DATASET_INDEX_REFRESH_INTERVAL seconds, or
+    by refresh_dataset_index. Datasets missing from the index are rejected without any filesystem call.
+    """
+    with _dataset_index_lock:
+        built_root = _dataset_index['root']
+        age = time.monotonic() - _dataset_index['built']
+    if built_root != app.config['DATASETS_ROOT']:
+        with _dataset_index_build_lock:
+            # the index may have been built by another request in the meantime
+            if _dataset_index['root'] != app.config['DATASETS_ROOT']:
+                _rebuild_dataset_index()
+    elif age > app.config['DATASET_INDEX_REFRESH_INTERVAL']:
+        _refresh_dataset_index_in_background()
+
+    paths = _dataset_index['paths']
+    key = (dataset_name, filetype, var, freq, period or '', partition)
+    # formats without {period} are stored with a None period and match any requested period
+    return paths.get(key) or paths.get(key[:4] + (None, partition))
 
 
 def open_dataset_by_path(path):
@@ -50,25 +187,422 @@ def open_dataset_by_path(path):
     :return: Dataset object
     """
     try:
-        dataset = xr.open_dataset(path, decode_times=False)
-        dataset['time'] = xr.decode_cf(dataset).time
-        return dataset
+        return _get_cached_dataset(Path(path))
     except FileNotFoundError:
         raise FileNotFoundError(f"Dataset file not found: {path}")
 
 
+# Process-wide LRU cache of opened datasets: {path: ((mtime, inode), dataset)}
+_dataset_cache = OrderedDict()
+_dataset_cache_lock = threading.Lock()
+
+
+def _load_dataset(path, preload=False):
+    """
+    Open a netcdf file and decode its time axis
+    :param preload: read the whole dataset in memory and close the file if its size in memory is at most
+                    PRELOAD_DATASET_MAX_SIZE, see PRELOAD_DATASETS
+    """
+    dataset = xr.open_dataset(path, decode_times=False)
+    dataset['time'] = xr.decode_cf(dataset).time
+    if preload and dataset.nbytes <= app.config.get('PRELOAD_DATASET_MAX_SIZE', 0):
+        dataset.load()
+        dataset.close()
+    return dataset
+
+
+def _get_cached_dataset(path):
+    """
+    Return a dataset from the LRU cache, opening it if needed.
+    Entries are reopened when the file mtime or inode changes. The cache size is set with DATASET_CACHE_SIZE (0 disables
+    the cache).
+    The small datasets of PRELOAD_DATASETS (sea level and allowance) are held in memory.
+    A shallow copy of the cached dataset is returned: it shares the underlying file handle, but calling close() on it
+    is a no-op, so callers can't close a handle used by other requests.
+    :param path: Path of the dataset
+    :return: Dataset object
+    """
+    cache_size = app.config.get('DATASET_CACHE_SIZE', 0)
+    if cache_size <= 0:
+        return _load_dataset(path)
+
+    stat = path.stat()
+    signature = (stat.st_mtime_ns, stat.st_ino)
+    key = str(path)
+
+    with _dataset_cache_lock:
+        entry = _dataset_cache.get(key)
+        if entry and entry[0] == signature:
+            _dataset_cache.move_to_end(key)
+            return entry[1].copy()
+
+    root = app.config['DATASETS_ROOT']
+    dataset = _load_dataset(path, preload=path in {Path(p.format(root=root)) for p in app.config['PRELOAD_DATASETS']})
+
+    evicted = []
+    with _dataset_cache_lock:
+        if key in _dataset_cache:
+            evicted.append(_dataset_cache.pop(key)[1])
+        _dataset_cache[key] = (signature, dataset)
+        while len(_dataset_cache) > cache_size:
+            evicted.append(_dataset_cache.popitem(last=False)[1][1])
+
+    for old_dataset in evicted:
+        if old_dataset is not dataset:
+            old_dataset.close()
+
+    return dataset.copy()
+
+
+def clear_dataset_cache():
+    """
+    Close and remove all datasets from the dataset cache
+    """
+    with _dataset_cache_lock:
+        datasets = [dataset for _, dataset in _dataset_cache.values()]
+        _dataset_cache.clear()
+    for dataset in datasets:
+        dataset.close()
+
+
+class GridAxis:
+    """
+    Nearest index lookup on a 1-D coordinate (lat or lon) of a grid.
+    Regular axes (constant step) use arithmetic from the origin and step, others fall back to searchsorted.
+    Ties are resolved like dataset.sel(method='nearest'), towards the highest coordinate value.
+    """
+
+    def __init__(self, values):
+        values = np.asarray(values)
+        if not np.issubdtype(values.dtype, np.floating):
+            values = values.astype('float64')
+        self.size = values.size
+        self.decreasing = self.size > 1 and values[0] > values[-1]
+        # values are kept in increasing order
+        self.values = values[::-1] if self.decreasing else values
+        self.origin = self.values[0]
+        self.step = (self.values[-1] - self.origin) / (self.size - 1) if self.size > 1 else 0
+        # the arithmetic guess is off by at most one index as long as coordinates are within a quarter step of the
+        # regular grid, which also tolerates coordinates rounded in the files
+        self.regular = self.step > 0 and bool(
+            np.all(np.abs(self.values - self.origin - self.step * np.arange(self.size)) <= self.step / 4))
+
+    def nearest(self, values):
+        """
+        Return the indices of the coordinates nearest to an array of values
+        """
+        # compare in the coordinate dtype, like pandas does
+        values = np.asarray(values, dtype=self.values.dtype)
+        last = self.size - 1
+        if self.regular:
+            left = np.clip(np.floor((values - self.origin) / self.step), -1, last).astype(int)
+            # correct rounding errors so that left is the last index where the coordinate is <= value
+            left += (left < last) & (self.values[np.minimum(left + 1, last)] <= values)
+            left -= (left >= 0) & (self.values[np.maximum(left, 0)] > values)
+        else:
+            left = np.searchsorted(self.values, values, side='right') - 1
+        right = np.minimum(left + 1, last)
+        left = np.maximum(left, 0)
+        index = np.where(np.abs(self.values[right] - values) <= np.abs(values - self.values[left]), right, left)
+        return last - index if self.decreasing else index
+
+    def nearest_index(self, value):
+        """
+        Return the index of the coordinate nearest to a single value
+        """
+        return int(self.nearest(np.array([value]))[0])
+
+
+# Grid axes of all dataset families, indexed by (size, first value, last value) of the coordinate
+_grid_axes = {}
+
+
+def get_grid_axis(coord):
+    """
+    Return the GridAxis of a coordinate, computed once per grid
+    """
+    values = coord.values
+    key = (values.size, values[0], values[-1])
+    axis = _grid_axes.get(key)
+    if axis is None:
+        axis = _grid_axes[key] = GridAxis(values)
+    return axis
+
+
+def check_coordinates(lats, lons):
+    """
+    Raise BadRequest if a latitude or longitude is not a finite number, which has no nearest grid cell
+    """
+    coordinates = np.concatenate([np.ravel(lats), np.ravel(lons)]).astype('float64')
+    if not np.isfinite(coordinates).all():
+        raise BadRequest("Invalid coordinates")
+
+
+def select_nearest_point(dataset, lat, lon):
+    """
+    Return the grid cell nearest to (lat, lon), same as dataset.sel(lat=lat, lon=lon, method='nearest') but using isel
+    :param dataset: xarray dataset with lat and lon dimensions
+    :param lat: latitude
+    :param lon: longitude
+    :return: a slice from the dataset
+    """
+    check_coordinates(lat, lon)
+    return dataset.isel(lat=get_grid_axis(dataset['lat']).nearest_index(lat),
+                        lon=get_grid_axis(dataset['lon']).nearest_index(lon))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_io_executor(max_workers):
+    """
+    Thread pool shared by the requests of a worker to read files concurrently, see run_io_tasks.
+    Created on first use; ThreadPoolExecutor only starts its threads when tasks are submitted, so a pool created
+    twice by concurrent first calls costs nothing.
+    """
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='io')
+
+
+def run_io_tasks(*tasks):
+    """
+    Run independent reads concurrently in the I/O thread pool (IO_WORKERS threads) and return their results in order.
+    The exception raised by a task, if any, is raised again here.
+    Tasks must not submit other tasks to the pool. The HDF5 calls themselves are serialized by the lock of the xarray
+    netCDF4 backend (HDF5 is not thread-safe), so files opened with open_dataset can be read from any task.
+    :param tasks: functions without arguments, called within the application context
+    :return: list of results
+    """
+    if len(tasks) <= 1 or app.config.get('IO_WORKERS', 0) <= 1:
+        return [task() for task in tasks]
+
+    current_app = app._get_current_object()
+
+    def _run(task):
+        with current_app.app_context():
+            return task()
+
+    futures = [_get_io_executor(app.config['IO_WORKERS']).submit(_run, task) for task in tasks]
+    return [future.result() for future in futures]
+
+
+def get_grid_cell(dataset, lat, lon):
+    """
+    Return the (lat, lon) indices of the grid cell nearest to (lat, lon), see select_nearest_point
+    """
+    check_coordinates(lat, lon)
+    return (get_grid_axis(dataset['lat']).nearest_index(lat),
+            get_grid_axis(dataset['lon']).nearest_index(lon))
+
+
+def get_dataset_signature(dataset):
+    """
+    Return the (mtime, inode) of the file a dataset was opened from, used to invalidate values computed from it
+    """
+    stat = os.stat(dataset.encoding['source'])
+    return stat.st_mtime_ns, stat.st_ino
+
+
+# Indices of the time steps of each month in the datasets: {(path, size): ((mtime, inode), {month number: indices})}
+_month_indices = {}
+_month_indices_lock = threading.Lock()
+
+
+def get_month_indices(dataset, monthnumber):
+    """
+    Return the indices of the time steps of a month (or of a season, with its first month) in a dataset.
+    Indices are computed once per file and kept until the file changes.
+    :param dataset: dataset with a decoded time coordinate
+    :param monthnumber: month number (1-12)
+    :return: int array
+    """
+    source = dataset.encoding.get('source')
+    if source is None:
+        return np.flatnonzero(dataset.time.dt.month.values == monthnumber)
+
+    # the time axis is identified by the file and its size, in case the dataset was already subset in time
+    key = (source, dataset.time.size)
+    signature = get_dataset_signature(dataset)
+    with _month_indices_lock:
+        entry = _month_indices.get(key)
+        if entry is None or entry[0] != signature:
+            months = dataset.time.dt.month.values
+            entry = _month_indices[key] = (signature, {month: np.flatnonzero(months == month)
+                                                       for month in range(1, 13)})
+    return entry[1][monthnumber]
+
+
+def select_month(dataset, monthnumber):
+    """
+    Return the time steps of a month (or of a season, with its first month) of a dataset, same as
+    dataset.sel(time=(dataset.time.dt.month == monthnumber)) but using indices computed once per file, so that only these
+    time steps are read
+    """
+    return dataset.isel(time=get_month_indices(dataset, monthnumber))
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of computed responses, shared by the threads of a worker.
+    Each entry is stored with a signature (usually the signatures of the files it was computed from, see
+    get_dataset_signature) and is discarded when the signature given on lookup differs.
+    When spill is enabled, entries evicted from memory are pickled under CACHE_FOLDER/responses/<name> and read back
+    on a later miss, so they survive restarts and are shared between workers.
+    """
+
+    def __init__(self, name, size_setting, spill_setting):
+        """
+        :param name: name of the cache, used for the spill folder
+        :param size_setting: config key of the maximum number of entries kept in memory (0 disables the cache)
+        :param spill_setting: config key enabling the spill of evicted entries to disk
+        """
+        self.name = name
+        self.size_setting = size_setting
+        self.spill_setting = spill_setting
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _spill_path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return app.config['CACHE_FOLDER'] / "responses" / self.name / f"{digest}.pickle"
+
+    def get(self, key, signature):
+        """
+        Return the value cached for key, or None if it is missing or its signature differs
+        """
+        if app.config.get(self.size_setting, 0) <= 0:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                if entry[0] == signature:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+        if not app.config.get(self.spill_setting, False):
+            return None
+        try:
+            with open(self._spill_path(key), 'rb') as f:
+                spilled_key, spilled_signature, value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        if spilled_key != key or spilled_signature != signature:
+            return None
+        self.set(key, signature, value, spill=False)
+        return value
+
+    def set(self, key, signature, value, spill=True):
+        """
+        Store a value in the cache, evicting the least recently used entries
+        :param spill: if False, evicted entries are not written to disk
+        """
+        cache_size = app.config.get(self.size_setting, 0)
+        if cache_size <= 0:
+            return
+
+        evicted = []
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (signature, value)
+            while len(self._entries) > cache_size:
+                evicted.append(self._entries.popitem(last=False))
+
+        if spill and app.config.get(self.spill_setting, False):
+            for evicted_key, (evicted_signature, evicted_value) in evicted:
+                self.persist(evicted_key, evicted_signature, evicted_value)
+
+    def persist(self, key, signature, value):
+        """
+        Write an entry to the spill folder, where it will be found by the workers on their next miss
+        """
+        path = self._spill_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmpfile = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmpfile, 'wb') as f:
+            pickle.dump((key, signature, value), f)
+        tmpfile.replace(path)
+
+    def clear(self):
+        """
+        Remove all entries kept in memory
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+def convert_times_to_timestamps(times, year_offset: int=0):
+    """
+    Converts an array of datetime64 to milliseconds since 1970-01-01, same as
+    int(Timestamp.replace(year=year + year_offset).timestamp() * 1000) for each value
+    :return: int64 array
+    """
+    times = np.asarray(times).astype('datetime64[ns]')
+    if year_offset:
+        # Timestamp.replace fails for days missing from the target month
+        months = times.astype('datetime64[M]')
+        shifted_months = months + np.timedelta64(12 * year_offset, 'M')
+        times = shifted_months.astype('datetime64[ns]') + (times - months.astype('datetime64[ns]'))
+        if np.any(times.astype('datetime64[M]') != shifted_months):
+            raise ValueError("day is out of range for month")
+    nanoseconds = times.view('int64')
+    if np.all(nanoseconds % 1_000_000_000 == 0):
+        return nanoseconds // 1_000_000
+    # Timestamp.timestamp() rounds to the microsecond first
+    return np.array([int(round(ns / 1e9, 6) * 1000) for ns in nanoseconds.tolist()], dtype='int64')
+
+
+def _round_rows(values, decimals):
+    """
+    Round a 2-D array and return it as a list of rows, of floats (or ints if decimals is 0)
+    """
+    values = np.round(values.astype('float64'), decimals)
+    if decimals > 0:
+        return values.tolist()
+    if np.all(np.isfinite(values)):
+        return values.astype('int64').tolist()
+    # raises the same error as int() for NaN or infinite values
+    return [list(map(int, row)) for row in values.tolist()]
+
+
+def convert_time_series_array_to_list(timestamps, values, decimals):
+    """
+    Converts a time series array to a list, see convert_time_series_dataset_to_list
+    :param timestamps: int array of milliseconds since 1970-01-01 (see convert_times_to_timestamps)
+    :param values: 2-D array (time x columns)
+    """
+    return [[timestamp] + row for timestamp, row in zip(timestamps.tolist(), _round_rows(values, decimals))]
+
+
+def convert_time_series_array_to_dict(timestamps, values, decimals):
+    """
+    Converts a time series array to a dict, see convert_time_series_dataset_to_dict
+    :param timestamps: int array of milliseconds since 1970-01-01 (see convert_times_to_timestamps)
+    :param values: 2-D array (time x columns)
+    """
+    return dict(zip(timestamps.tolist(), _round_rows(values, decimals)))
+
+
+def _time_series_dataset_to_arrays(dataset, year_offset):
+    """
+    Return the timestamps and values of a time series, with the same columns as dataset.to_dataframe()
+    :param dataset: xarray Dataset or DataArray with a single time dimension
+    :return: (int array of timestamps, 2-D array of values (time x columns))
+    """
+    if isinstance(dataset, xr.DataArray):
+        dataset = dataset.to_dataset(name=dataset.name)
+    columns = [k for k in dataset.variables if k not in dataset.dims]
+    size = dataset.dims['time']
+    values = np.empty((size, len(columns)), dtype='float64')
+    for i, column in enumerate(columns):
+        values[:, i] = dataset.variables[column].set_dims({'time': size}).values
+    return convert_times_to_timestamps(dataset['time'].values, year_offset), values
+
+
 def convert_time_series_dataset_to_list(dataset, decimals, year_offset: int=0):
     """
     Converts xarray dataset to a list.
     We assume that the coordinates are timestamps, which are converted to milliseconds since 1970-01-01 (integer)
     """
-
-    # we cast to int if decimals is 0
-    def _convert(float_list):
-        return float_list if decimals > 0 else list(map(int, float_list))
-
-    df_list = dataset.to_dataframe().astype('float64').round(decimals).reset_index().values.tolist()
-    return [[int(a[0].replace(year=a[0].year + year_offset).timestamp() * 1000)] + _convert(a[1:]) for a in df_list]
+    return convert_time_series_array_to_list(*_time_series_dataset_to_arrays(dataset, year_offset), decimals)
 
 
 def convert_time_series_dataset_to_dict(dataset, decimals, year_offset: int=0):
@@ -76,19 +610,17 @@ def convert_time_series_dataset_to_dict(dataset, decimals, year_offset: int=0):
     Converts xarray dataset to a dict.
     We assume that the coordinates are timestamps, which are converted to milliseconds since 1970-01-01 (integer)
     """
-
-    # we cast to int if decimals is 0
-    def _convert(float_list):
-        return float_list if decimals > 0 else list(map(int, float_list))
-
-    df_list = dataset.to_dataframe().astype('float64').round(decimals).reset_index().values.tolist()
-    return {int(a[0].replace(year=a[0].year + year_offset).timestamp() * 1000): _convert(a[1:]) for a in df_list}
+    return convert_time_series_array_to_dict(*_time_series_dataset_to_arrays(dataset, year_offset), decimals)
 
 
 SAFE_CHARACTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-"  # Safe for URL
-SAFE_CHARACTER_LUT = {c: idx for idx, c in enumerate(SAFE_CHARACTERS)}
 MULTIPLIER = 100
 DIVIDER = 32
+# values of the ASCII characters in SAFE_CHARACTERS, -1 for the other characters
+_SAFE_CHARACTER_VALUES = np.full(256, -1, dtype=np.int64)
+_SAFE_CHARACTER_VALUES[[ord(c) for c in SAFE_CHARACTERS]] = np.arange(len(SAFE_CHARACTERS))
+# maximum number of digits of a compressed point, so that it fits in an int64
+MAX_POINT_DIGITS = 12
 
 
 def format_metadata(ds) -> str:
@@ -127,80 +659,388 @@ def format_metadata(ds) -> str:
 
 def decode_compressed_points(compressed_points):
     """
-    Decode compressed list of points (lat,lon) and returns it as a list of tuples
+    Decode compressed list of points (lat,lon) and returns it as a (N, 2) array
     See: https://github.com/ljanecek/point-compression/blob/master/index.js
     """
-    lat_lon = []
-    points_array = []
-    point = []
-    last_lat = 0
-    last_lon = 0
+    codes = np.frombuffer(compressed_points.encode('ascii', errors='replace'), dtype=np.uint8)
+    nums = _SAFE_CHARACTER_VALUES[codes]
+    if np.any(nums < 0):
+        raise KeyError("Invalid character in compressed points")
 
-    for c in compressed_points:
-        num = SAFE_CHARACTER_LUT[c]
+    # each point is a number written in base DIVIDER, least significant digit first, whose last digit is < DIVIDER
+    terminal = nums < DIVIDER
+    ends = np.flatnonzero(terminal)
+    if ends.size == 0:
+        return np.empty((0, 2))
+    nums = nums[:ends[-1] + 1]
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    lengths = ends - starts + 1
+    if lengths.max() > MAX_POINT_DIGITS:
+        raise ValueError("Compressed point out of range")
+    digits = np.where(terminal[:len(nums)], nums, nums - DIVIDER)
+    powers = np.arange(len(nums)) - np.repeat(starts, lengths)
+    results = np.add.reduceat(digits * DIVIDER ** powers, starts)
 
-        if num < DIVIDER:
-            point.append(num)
-            points_array.append(point)
-            point = []
-        else:
-            num = num - DIVIDER
-            point.append(num)
+    # inverse of the Cantor pairing of the zigzag-encoded deltas
+    d_iag = ((np.sqrt(8 * results + 5) - 1) / 2).astype(np.int64)
+    lat_y = results - (d_iag * (d_iag + 1)) / 2
+    lon_x = d_iag - lat_y
+    deltas = np.stack([lat_y, lon_x], axis=1)
+    deltas = np.where(deltas % 2 == 1, (deltas + 1) * -1, deltas) / 2
+
+    return np.cumsum(deltas, axis=0) / MULTIPLIER
+
+
+def _shapefile_signature(path):
+    """
+    Return the name, mtime and size of the files of a shapefile (.shp, .dbf, .shx, ...)
+    """
+    return sorted([entry.name, entry.stat().st_mtime_ns, entry.stat().st_size]
+                  for entry in path.parent.glob(f"{glob.escape(path.stem)}.*"))
+
+
+def _generate_grid_centroids(shapefile, outfile):
+    """
+    Save the (lat, lon) centroids of the cells of a grid, in gid order
+    """
+    geodf = gpd.GeoDataFrame.from_file(shapefile)
+
+    # validate if gid matches index in dataframe
+    assert np.array_equal(geodf['gid'].values, geodf.index.values)
+
+    centroids = geodf.centroid
+    tmpfile = outfile.with_suffix('.tmp')
+    with tmpfile.open('wb') as f:
+        np.save(f, np.column_stack([centroids.y.values, centroids.x.values]))
+    tmpfile.rename(outfile)
+
+
+def generate_kdtrees(force=False):
+    """
+        Pre-compute the centroids of the grids cells, from which get_grid_lookup builds the kd-trees, since reading
+        the shapefiles takes too long for web usage.
+        Grids are processed in parallel. Grids whose shapefile did not change since the last run (see
+        CACHE_FOLDER/kdtree-manifest.json) are skipped, unless force is set.
+    """
+    app.config['CACHE_FOLDER'].mkdir(parents=True, exist_ok=True)
+    manifest_file = app.config['CACHE_FOLDER'] / "kdtree-manifest.json"
+    try:
+        with manifest_file.open() as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+
+    futures = {}
+    signatures = {}
+    with ProcessPoolExecutor(max_workers=min(len(app.config['GRIDS']), os.cpu_count() or 1) or 1) as executor:
+        for gridname, gridpath in app.config['GRIDS'].items():
+            shapefile = app.config['DATASETS_ROOT'] / gridpath
+            outfile = _grid_centroids_path(gridname)
+            signatures[gridname] = {'shapefile': str(gridpath), 'files': _shapefile_signature(shapefile)}
+            if not force and outfile.exists() and manifest.get(gridname) == signatures[gridname]:
+                print(f"Kd-tree for shapefile {gridname} is up to date.")
+                continue
+            print(f"Generating kd-tree for shapefile {gridname}.")
+            futures[gridname] = executor.submit(_generate_grid_centroids, shapefile, outfile)
+
+        for gridname, future in futures.items():
+            future.result()
+            manifest[gridname] = signatures[gridname]
+
+    tmpfile = manifest_file.with_suffix('.tmp')
+    with tmpfile.open('w') as f:
+        json.dump(manifest, f)
+    tmpfile.rename(manifest_file)
+
+
+class GridLookup:
+    """
+    Nearest cell lookup on the centroids of a grid, where the index of a centroid is the gid of its cell.
+    With the 'lattice' engine, the gids of grids whose centroids lie on a regular lattice are computed from the
+    origin and step of the lattice. Points in missing cells (ex: ocean), outside of the lattice or on the border of two
+    cells are looked up in the kd-tree, like all points of the 'kdtree' engine, so both engines return the same gids.
+    """
+    # distance to a cell border, in steps, under which the kd-tree resolves the tie. Centroids must be within a quarter
+    # of it from the lattice, so that the borders of the kd-tree cells are in that margin.
+    BORDER_TOLERANCE = 1e-3
+
+    def __init__(self, centroids, engine='kdtree'):
+        """
+        :param centroids: (N, 2) array of the (lat, lon) centroids of the cells
+        :param engine: 'lattice' or 'kdtree'
+        """
+        self.tree = KDTree(centroids)
+        self.gids = None
+        if engine == 'lattice' and len(centroids) > 1:
+            self._build_lattice(centroids)
 
-    for point in points_array:
-        result = 0
-        point.reverse()
-        for p in point:
-            if result == 0:
-                result = p
-            else:
-                result = result * DIVIDER + p
+    @property
+    def engine(self):
+        """
+        Engine actually used: 'lattice', or 'kdtree' when the centroids are not on a regular lattice
+        """
+        return 'kdtree' if self.gids is None else 'lattice'
 
-        d_iag = int((math.sqrt(8 * result + 5) - 1) / 2)
+    def _build_lattice(self, centroids):
+        origin = centroids.min(axis=0)
+        step = np.array([np.diff(np.unique(np.round(centroids[:, axis], 6))).min(initial=np.inf) for axis in [0, 1]])
+        if not np.all(np.isfinite(step)):
+            return
+        # the step estimated from rounded coordinates is refined with a linear fit of the centroids on the lattice
+        positions = np.rint((centroids - origin) / step).astype(np.int64)
+        for axis in [0, 1]:
+            step[axis], origin[axis] = np.polyfit(positions[:, axis], centroids[:, axis], 1)
+        if np.any(np.abs(origin + positions * step - centroids) > self.BORDER_TOLERANCE / 4 * step):
+            warnings.warn("Grid centroids are not on a regular lattice, the kd-tree is used")
+            return
+        gids = np.full(positions.max(axis=0) + 1, -1, dtype=np.int64)
+        gids[positions[:, 0], positions[:, 1]] = np.arange(len(centroids))
+        if np.count_nonzero(gids >= 0) != len(centroids):
+            warnings.warn("Grid has several centroids in the same lattice cell, the kd-tree is used")
+            return
+        self.origin, self.step, self.gids = origin, step, gids
 
-        lat_y = result - (d_iag * (d_iag + 1)) / 2
-        lon_x = d_iag - lat_y
+    def query(self, points, distance_upper_bound):
+        """
+        Return the gids of the cells nearest to points, and whether a cell was found within distance_upper_bound.
+        Like KDTree.query, the gid of unmatched points is the number of cells.
+        :param points: (N, 2) array of (lat, lon)
+        """
+        points = np.asarray(points, dtype='float64').reshape(-1, 2)
+        gids = np.full(len(points), -1, dtype=np.int64)
+        matched = np.ones(len(points), dtype=bool)
 
-        if lat_y % 2 == 1:
-            lat_y = (lat_y + 1) * -1
-        if lon_x % 2 == 1:
-            lon_x = (lon_x + 1) * -1
+        # cells are found by arithmetic when their centroid is surely within distance_upper_bound
+        if self.gids is not None and np.hypot(*self.step) / 2 < distance_upper_bound:
+            fractions = (points - self.origin) / self.step
+            positions = np.rint(fractions).astype(np.int64)
+            border = np.any(np.abs(np.abs(fractions - positions) - 0.5) < self.BORDER_TOLERANCE, axis=1)
+            inside = ~border & np.all((positions >= 0) & (positions < self.gids.shape), axis=1)
+            gids[inside] = self.gids[positions[inside, 0], positions[inside, 1]]
 
-        lat_y = lat_y / 2
-        lon_x = lon_x / 2
-        lat = lat_y + last_lat
-        lon = lon_x + last_lon
+        fallback = gids < 0
+        if fallback.any():
+            distances, gids[fallback] = self.tree.query(points[fallback], distance_upper_bound=distance_upper_bound)
+            matched[fallback] = np.isfinite(distances)
+        return gids, matched
 
-        last_lat = lat
-        last_lon = lon
-        lat = lat / MULTIPLIER
-        lon = lon / MULTIPLIER
 
-        lat_lon.append((lat, lon))
+# nearest cell lookups of the grids kept per worker: {gridname: ((mtime, inode), GridLookup)}
+_grid_lookups = {}
+_grid_lookups_lock = threading.Lock()
 
-    return lat_lon
 
+def _grid_centroids_path(gridname):
+    return app.config['CACHE_FOLDER'] / f"kdtree-{gridname}.npy"
 
-def generate_kdtrees():
+
+def get_grid_lookup(gridname):
+    """
+    Return the GridLookup of a grid, using the engine set in GRID_LOOKUP_ENGINES.
+    It is built on first use from the centroids saved by generate_kdtrees and rebuilt when that file changes.
+    :param gridname: name of the grid in GRIDS
+    """
+    if gridname not in app.config['GRIDS']:
+        raise KeyError(f"Invalid grid: {gridname}")
+    path = _grid_centroids_path(gridname)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_ino)
+
+    with _grid_lookups_lock:
+        entry = _grid_lookups.get(gridname)
+    if entry and entry[0] == signature:
+        return entry[1]
+
+    lookup = GridLookup(np.load(path), app.config['GRID_LOOKUP_ENGINES'].get(gridname, 'kdtree'))
+    with _grid_lookups_lock:
+        _grid_lookups[gridname] = (signature, lookup)
+    return lookup
+
+
+def _describe_dataset(dataset):
     """
-        Pre-generate a pickled kdtree since this operation takes too long for web usage
+    Return the catalog entry of a dataset: its dimensions, coordinates ranges, time axis and variables
     """
+    entry = {
+        'dims': dict(dataset.dims),
+        'coords': {},
+        'time': [],
+        'variables': {},
+    }
+    for name, coord in dataset.coords.items():
+        if name == 'time' or coord.ndim != 1 or coord.size == 0 or not np.issubdtype(coord.dtype, np.number):
+            continue
+        entry['coords'][name] = {'min': float(coord.min()), 'max': float(coord.max()), 'size': coord.size}
+
+    if 'time' in dataset.coords:
+        times = dataset['time'].values
+        if np.issubdtype(times.dtype, np.datetime64):
+            entry['time'] = np.datetime_as_string(times, unit='D').tolist()
+        else:
+            entry['time'] = [t.strftime('%Y-%m-%d') for t in times]
+        entry['time_units'] = dataset['time'].encoding.get('units')
+        entry['calendar'] = dataset['time'].encoding.get('calendar')
+
+    for name, variable in dataset.data_vars.items():
+        chunksizes = variable.encoding.get('chunksizes')
+        entry['variables'][name] = {
+            'dims': list(variable.dims),
+            'dtype': str(variable.dtype),
+            'units': variable.attrs.get('units'),
+            'chunks': list(chunksizes) if chunksizes else None,
+        }
+    return entry
+
+
+def build_catalog():
+    """
+    Scan DATASETS_ROOT and write the catalog of all netcdf files to CACHE_FOLDER, so requests can be validated without
+    opening the datasets
+    """
+    root = app.config['DATASETS_ROOT']
+    catalog = {}
+    for dirpath, _, filenames in os.walk(root, followlinks=True):
+        for filename in sorted(filenames):
+            if not filename.endswith('.nc'):
+                continue
+            path = Path(dirpath) / filename
+            try:
+                with xr.open_dataset(path, decode_times=False) as dataset:
+                    dataset['time'] = xr.decode_cf(dataset).time
+                    catalog[str(path.relative_to(root))] = _describe_dataset(dataset)
+            except Exception as ex:
+                print(f"Skipping {path}: {ex}")
+
     app.config['CACHE_FOLDER'].mkdir(parents=True, exist_ok=True)
-    for gridname, gridpath in app.config['GRIDS'].items():
-        print(f"Generating kd-tree for shapefile {gridname}. This will take a few minutes.")
-        outfile = app.config['CACHE_FOLDER'] / f"kdtree-{gridname}.pickle"
-        tmpfile = outfile.with_suffix('.tmp')
-        geodf = gpd.GeoDataFrame.from_file(app.config['DATASETS_ROOT'] / gridpath)
+    outfile = app.config['CACHE_FOLDER'] / "catalog.json"
+    tmpfile = outfile.with_suffix('.tmp')
+    with tmpfile.open('w') as f:
+        json.dump(catalog, f)
+    tmpfile.rename(outfile)
+    print(f"Catalog of {len(catalog)} datasets written to {outfile}")
+
+
+# In-memory copy of the catalog file: {'signature': (mtime, inode), 'datasets': {relative path: entry}}
+_catalog = {'signature': None, 'datasets': {}}
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    Return the catalog built with `flask build-catalog`, reloaded when the file changes.
+    An empty catalog is returned if it was never built.
+    """
+    catalog_file = app.config['CACHE_FOLDER'] / "catalog.json"
+    try:
+        stat = catalog_file.stat()
+    except FileNotFoundError:
+        return {}
+    signature = (stat.st_mtime_ns, stat.st_ino)
+
+    with _catalog_lock:
+        if _catalog['signature'] != signature:
+            with catalog_file.open() as f:
+                datasets = json.load(f)
+            for entry in datasets.values():
+                entry['time_set'] = set(entry['time'])
+            _catalog.update(signature=signature, datasets=datasets)
+        return _catalog['datasets']
 
-        # validate if gid matches index in dataframe
-        for idx, row in geodf.iterrows():
-            assert row.gid == idx
 
-        centroids = geodf.centroid
-        tree = KDTree(np.array(list(zip(centroids.y, centroids.x))))
-        with tmpfile.open('wb') as f:
-            pickle.dump(tree, f)
-        tmpfile.rename(outfile)
+def get_catalog_entry(path):
+    """
+    Return the catalog entry of a dataset, or None if it isn't in the catalog
+    """
+    try:
+        key = str(Path(path).relative_to(app.config['DATASETS_ROOT']))
+    except ValueError:
+        return None
+    return get_catalog().get(key)
+
+
+def check_catalog(path, variables=(), times=()):
+    """
+    Validate that variables and times (YYYY-MM-DD strings) are available in a dataset, using the catalog.
+    Nothing is checked if the dataset is not in the catalog.
+    :raise ValueError: if a variable or a time is not available
+    :return: the catalog entry of the dataset, or None
+    """
+    entry = get_catalog_entry(path)
+    if entry is None:
+        return None
+
+    missing_variables = [v for v in variables if v not in entry['variables']]
+    if missing_variables:
+        raise ValueError(f"variable {', '.join(missing_variables)} not available")
+    missing_times = [t for t in times if t not in entry['time_set']]
+    if missing_times:
+        raise ValueError(f"period {', '.join(missing_times)} not available")
+    return entry
+
+
+def check_dataset_request(dataset_name, filetype, var, freq, period=None, partition=None, variables=(), times=()):
+    """
+    Validate a request to a dataset without opening it: the dataset must exist in the dataset index and the requested
+    variables and times must exist in the catalog.
+    :raise FileNotFoundError: if the dataset doesn't exist
+    :raise ValueError: if a variable or a time is not available
+    :return: the catalog entry of the dataset, or None
+    """
+    dataset_path = get_dataset_path(dataset_name, filetype, var, freq, period, partition)
+    if dataset_path is None:
+        raise FileNotFoundError(
+            f"Dataset not found for {dataset_name}, {filetype}, {var}, {freq}, {period}, {partition}")
+    return check_catalog(dataset_path, variables, times)
+
+
+def _point_dataset_path(dataset_path):
+    """
+    Return the path of the copy of a dataset chunked for point access
+    """
+    return app.config['CACHE_FOLDER'] / "point_datasets" / Path(dataset_path).relative_to(app.config['DATASETS_ROOT'])
+
+
+def get_point_dataset_path(dataset_path):
+    """
+    Return the path of the copy of a dataset chunked for point access if it is up to date, else the dataset path
+    """
+    point_path = _point_dataset_path(dataset_path)
+    try:
+        if point_path.stat().st_mtime_ns >= Path(dataset_path).stat().st_mtime_ns:
+            return point_path
+    except FileNotFoundError:
+        pass
+    return dataset_path
+
+
+def rechunk_point_datasets():
+    """
+    Write copies of the allyears and 30ygraph datasets chunked for reading time series at single points: each chunk
+    spans the whole time axis and POINT_CHUNK_SIZE x POINT_CHUNK_SIZE grid cells.
+    Copies that are more recent than their dataset are skipped.
+    """
+    refresh_dataset_index()
+    chunk_size = app.config['POINT_CHUNK_SIZE']
+    dataset_paths = sorted({path for (_, filetype, _, _, _, partition), path in _dataset_index['paths'].items()
+                            if filetype in ['allyears', '30ygraph'] and partition is None})
+    for dataset_path in dataset_paths:
+        point_path = _point_dataset_path(dataset_path)
+        if get_point_dataset_path(dataset_path) == point_path:
+            continue
+
+        print(f"Rechunking {dataset_path}")
+        point_path.parent.mkdir(parents=True, exist_ok=True)
+        tmpfile = point_path.with_suffix('.tmp')
+        with xr.open_dataset(dataset_path, decode_times=False, mask_and_scale=False) as dataset:
+            for variable in dataset.data_vars.values():
+                if set(variable.dims) != {'time', 'lat', 'lon'}:
+                    continue
+                variable.encoding.pop('contiguous', None)
+                variable.encoding['chunksizes'] = tuple(
+                    dataset.dims[dim] if dim == 'time' else min(chunk_size, dataset.dims[dim]) for dim in variable.dims)
+                variable.encoding['zlib'] = True
+            dataset.to_netcdf(tmpfile, format='NETCDF4')
+        tmpfile.rename(point_path)
 
 
 def make_zip(content):
@@ -216,6 +1056,103 @@ def make_zip(content):
     buffer.seek(0)
     return buffer
 
+
+# S2D datasets of each (var, freq), opened once per release and invalidated together when the forecast file changes:
+# {(var, freq): ((mtime, inode), (release date, forecast, climatology, {skill reference month: skill}))}
+_s2d_datasets = {}
+_s2d_datasets_lock = threading.Lock()
+
+
+def _get_s2d_release(var, freq):
+    """
+    Return the release date, forecast and climatology datasets and the skill datasets opened so far of a S2D variable
+    and frequency
+    """
+    if (var not in app.config['S2D_VARIABLES']) or (freq not in app.config['S2D_FREQUENCIES']):
+        raise ValueError(f"Invalid variable or frequency: {var} {freq}")
+
+    forecast_path = app.config['NETCDF_S2D_FORECAST_FILENAME_FORMATS'].format(
+        root=app.config['DATASETS_ROOT'],
+        var=var,
+        freq=freq
+    )
+    try:
+        stat = os.stat(forecast_path)
+        signature = (stat.st_mtime_ns, stat.st_ino)
+    except FileNotFoundError:
+        # not cached, open_dataset_by_path reports the missing file
+        signature = None
+
+    with _s2d_datasets_lock:
+        entry = _s2d_datasets.get((var, freq))
+    if signature is not None and entry and entry[0] == signature:
+        return entry[1]
+
+    forecast_dataset = open_dataset_by_path(forecast_path)
+    # The input data should normally only use the first day of months, so the release day is always "01"
+    release_date = str(forecast_dataset['time'].min().values.astype('datetime64[D]'))
+    climatology_dataset = open_dataset_by_path(app.config['NETCDF_S2D_CLIMATOLOGY_FILENAME_FORMATS'].format(
+        root=app.config['DATASETS_ROOT'],
+        var=var,
+        freq=freq
+    ))
+
+    release = (release_date, forecast_dataset, climatology_dataset, {})
+    if signature is not None:
+        with _s2d_datasets_lock:
+            _s2d_datasets[(var, freq)] = (signature, release)
+    return release
+
+
+def get_s2d_datasets(var: str, freq: str, ref_month: int = None) -> tuple[str, xr.Dataset, xr.Dataset, xr.Dataset]:
+    """
+    Return the release date and the forecast, climatology and skill datasets of a S2D variable and frequency.
+    The datasets are opened once per release: they are all reopened when the forecast file changes.
+
+    :param var: variable name associated with the datasets
+    :param freq: frequency associated with the datasets
+    :param ref_month: month of the reference period of the skill dataset, the month of the release by default
+    :return: tuple with the release date (YYYY-MM-DD) and the forecast, climatology and skill datasets
+    """
+    release_date, forecast_dataset, climatology_dataset, skill_datasets = _get_s2d_release(var, freq)
+    ref_month = ref_month or int(release_date[5:7])
+    # the skill datasets are shared by the requests of the release, so that each one is opened only once
+    with _s2d_datasets_lock:
+        skill_dataset = skill_datasets.get(ref_month)
+        if skill_dataset is None:
+            skill_dataset = skill_datasets[ref_month] = open_dataset_by_path(
+                app.config['NETCDF_S2D_SKILL_FILENAME_FORMATS'].format(
+                    root=app.config['DATASETS_ROOT'],
+                    var=var,
+                    freq=freq,
+                    ref_period=f"{ref_month:02d}"
+                ))
+    return release_date, forecast_dataset, climatology_dataset, skill_dataset
+
+
+def _check_s2d_periods(period_dates: list[datetime.datetime], available: np.ndarray, dataset_name: str) -> None:
+    """
+    Raise an error listing all the period dates that are not available in a S2D dataset
+    """
+    missing = [str(period_date) for period_date, is_available in zip(period_dates, available) if not is_available]
+    if missing:
+        raise ValueError(f"Bad request: period{'s' if len(missing) > 1 else ''} {', '.join(missing)} "
+                         f"not available in {dataset_name} dataset")
+
+
+def _get_s2d_time_positions(dataset: xr.Dataset,
+                            times: list[datetime.datetime],
+                            period_dates: list[datetime.datetime],
+                            dataset_name: str) -> np.ndarray:
+    """
+    Return the positions of the given times in the time index of a S2D dataset, raising an error listing all the
+    corresponding period dates that are not available
+    """
+    positions = dataset.indexes['time'].get_indexer(times)
+    _check_s2d_periods(period_dates, positions >= 0, dataset_name)
+    return positions
+
+
 def load_s2d_datasets_by_periods(var: str,
                                  freq: str,
                                  period_dates: list[datetime.datetime],
@@ -230,42 +1167,22 @@ def load_s2d_datasets_by_periods(var: str,
     :param ref_period: datetime object representing the reference period for the skill dataset
     :return: tuple with the selected forecast, climatology and skill datasets
     """
-    # Load forecast data
-    forecast_dataset = open_dataset_by_path(app.config['NETCDF_S2D_FORECAST_FILENAME_FORMATS'].format(
-        root=app.config['DATASETS_ROOT'],
-        var=var,
-        freq=freq
-    ))
-    # Check that all period dates are available in the dataset before selecting them
-    for period_date in period_dates:
-        try:
-            forecast_dataset.sel(time=period_date)
-        except:
-            raise ValueError(f"Bad request: period {period_date} not available in forecast dataset")
-    forecast_slice = forecast_dataset.sel(time=period_dates)
+    _, forecast_dataset, climatology_dataset, skill_dataset = get_s2d_datasets(var, freq, ref_period.month)
 
-    # Load climatology data
-    climatology_dataset = open_dataset_by_path(app.config['NETCDF_S2D_CLIMATOLOGY_FILENAME_FORMATS'].format(
-        root=app.config['DATASETS_ROOT'],
-        var=var,
-        freq=freq
-    ))
-    climatology_period_dates = []
-    for period_date in period_dates:
-        climatology_period_dates.append(period_date.replace(year=1991))
-    climatology_slice = climatology_dataset.sel(time=climatology_period_dates)
+    # Check that all period dates are available in the datasets before selecting them, using the time index kept by
+    # each dataset of the release
+    forecast_positions = _get_s2d_time_positions(forecast_dataset, period_dates, period_dates, "forecast")
+    climatology_positions = _get_s2d_time_positions(climatology_dataset,
+                                                    [period_date.replace(year=1991) for period_date in period_dates],
+                                                    period_dates, "climatology")
 
-    # Load skill data
-    skill_dataset = open_dataset_by_path(app.config['NETCDF_S2D_SKILL_FILENAME_FORMATS'].format(
-        root=app.config['DATASETS_ROOT'],
-        var=var,
-        freq=freq,
-        ref_period=f"{ref_period.month:02d}"
-    ))
-    for period_date in period_dates:
-        if period_date.month not in skill_dataset['time'].dt.month.values:
-            raise ValueError(f"Bad request: period {period_date} not available in skill dataset")
-    skill_slice = skill_dataset.sel(time=skill_dataset['time'].dt.month.isin([d.month for d in period_dates]))
+    skill_months = skill_dataset.indexes['time'].month
+    requested_months = [period_date.month for period_date in period_dates]
+    _check_s2d_periods(period_dates, np.isin(requested_months, skill_months), "skill")
+
+    forecast_slice = forecast_dataset.isel(time=forecast_positions)
+    climatology_slice = climatology_dataset.isel(time=climatology_positions)
+    skill_slice = skill_dataset.isel(time=np.flatnonzero(np.isin(skill_months, requested_months)))
 
     return forecast_slice, climatology_slice, skill_slice
 
@@ -283,30 +1200,24 @@ def get_subset_by_bbox(dataset: xr.Dataset, bbox: Tuple[float, float, float, flo
     return subset_bbox(dataset, lat_bnds=[lat_min, lat_max], lon_bnds=[lon_min, lon_max])
 
 
-def get_subset_by_points(dataset: xr.Dataset, points: list[Tuple[float, float]]) -> xr.Dataset:
+def get_points_mask(dataset: xr.Dataset,
+                    points: list[Tuple[float, float]]) -> Tuple[list[float], list[float], np.ndarray]:
     """
-    Subsets a dataset by filtering its lat and lon coordinates to be the nearest values to the given points.
-
-    Note that in the returned dataset, any lat/lon combinations that don't correspond to any requested point
-    will be assigned nan values.
+    Return the lat and lon values of a dataset nearest to the given points, and a mask of the lat/lon combinations that
+    correspond to a requested point.
 
-    :param dataset: xarray dataset to subset
+    :param dataset: xarray dataset with lat and lon coordinates
     :param points: list of (lat, lon) tuples
-    :return: subsetted xarray dataset
+    :return: tuple with the sorted lat values, the sorted lon values and a (lat, lon) boolean mask
     """
+    check_coordinates([lat for lat, _ in points], [lon for _, lon in points])
     # Filter to the nearest concerned lat and lon values
-    nearest_points = [
-        (dataset.lat.sel(lat=lat, method="nearest").item(),
-         dataset.lon.sel(lon=lon, method="nearest").item())
-        for lat, lon in points
-    ]
+    lat_indices = get_grid_axis(dataset['lat']).nearest([lat for lat, _ in points])
+    lon_indices = get_grid_axis(dataset['lon']).nearest([lon for _, lon in points])
+    nearest_points = list(zip(dataset['lat'].values[lat_indices].tolist(), dataset['lon'].values[lon_indices].tolist()))
     used_lats = sorted(set(lat for lat, _ in nearest_points))
     used_lons = sorted(set(lon for _, lon in nearest_points))
 
-    subset = dataset.sel(lat=used_lats, lon=used_lons)
-
-    # Filter the subset to only keep the values that correspond exactly to the requested lat/lon combinations
-    # nan values are assigned to any lat/lon combinations that don't correspond to any requested point
     mask = np.full((len(used_lats), len(used_lons)), False)
 
     for lat, lon in nearest_points:
@@ -314,10 +1225,76 @@ def get_subset_by_points(dataset: xr.Dataset, points: list[Tuple[float, float]])
         j = used_lons.index(lon)
         mask[i, j] = True
 
+    return used_lats, used_lons, mask
+
+
+def get_subset_by_points(dataset: xr.Dataset, points: list[Tuple[float, float]]) -> xr.Dataset:
+    """
+    Subsets a dataset by filtering its lat and lon coordinates to be the nearest values to the given points.
+
+    Note that in the returned dataset, any lat/lon combinations that don't correspond to any requested point
+    will be assigned nan values.
+
+    :param dataset: xarray dataset to subset
+    :param points: list of (lat, lon) tuples
+    :return: subsetted xarray dataset
+    """
+    used_lats, used_lons, mask = get_points_mask(dataset, points)
+    subset = dataset.sel(lat=used_lats, lon=used_lons)
+
+    # Filter the subset to only keep the values that correspond exactly to the requested lat/lon combinations
+    # nan values are assigned to any lat/lon combinations that don't correspond to any requested point
     filtered_ds = subset.where(mask)
     return filtered_ds
 
 
+# Indices of the forecast coordinates nearest to each climatology coordinate, computed once per pair of S2D grids and
+# indexed by the name and (size, first value, last value) of both coordinates, like _grid_axes
+_s2d_regrid_indices = {}
+
+
+def _get_s2d_regrid_indices(forecast_coord: xr.DataArray, climatology_coord: xr.DataArray) -> xr.DataArray:
+    """
+    Return the indices of the forecast coordinates nearest to each climatology coordinate, indexed by the climatology
+    coordinate.
+    Same as interp(method='nearest') with fill_value='extrapolate': climatology coordinates outside of the forecast
+    grid use the nearest edge of the forecast grid.
+    """
+    name = climatology_coord.name
+    forecast_values = forecast_coord.values
+    climatology_values = climatology_coord.values
+    key = (name, forecast_values.size, forecast_values[0], forecast_values[-1],
+           climatology_values.size, climatology_values[0], climatology_values[-1])
+    indices = _s2d_regrid_indices.get(key)
+    if indices is None:
+        positions = xr.DataArray(np.arange(forecast_values.size, dtype='float64'), coords={name: forecast_values},
+                                 dims=name)
+        positions = positions.interp({name: climatology_values}, method='nearest',
+                                     kwargs={"fill_value": 'extrapolate'})
+        indices = _s2d_regrid_indices[key] = positions.astype(int)
+    return indices
+
+
+def regrid_s2d_forecast(forecast_dataset: xr.Dataset,
+                        climatology_dataset: xr.Dataset,
+                        lats: list[float],
+                        lons: list[float]) -> xr.Dataset:
+    """
+    Regrid forecast data according to the climatology data grid, only for the given climatology lat and lon values.
+    Each climatology cell takes the value of the nearest forecast cell, using index mappings computed once per grid.
+
+    :param forecast_dataset: xarray dataset on the forecast grid
+    :param climatology_dataset: xarray dataset on the whole climatology grid
+    :param lats: lat values of the climatology grid to regrid
+    :param lons: lon values of the climatology grid to regrid
+    :return: forecast dataset with the given lat and lon coordinates
+    """
+    lat_indices = _get_s2d_regrid_indices(forecast_dataset['lat'], climatology_dataset['lat']).sel(lat=lats)
+    lon_indices = _get_s2d_regrid_indices(forecast_dataset['lon'], climatology_dataset['lon']).sel(lon=lons)
+    return forecast_dataset.isel(lat=lat_indices.values, lon=lon_indices.values).assign_coords(
+        lat=lat_indices['lat'].values, lon=lon_indices['lon'].values)
+
+
 def retrieve_s2d_release_date(var, freq):
     """
     Return the release date of the forecast data associated with a given variable and frequency.
@@ -325,14 +1302,4 @@ def retrieve_s2d_release_date(var, freq):
     The returned string is in the YYYY-MM-DD format.
     The input data should normally only use the first day of months, so the returned day is always "01".
     """
-    if (var not in app.config['S2D_VARIABLES']) or (freq not in app.config['S2D_FREQUENCIES']):
-        raise ValueError(f"Invalid variable or frequency: {var} {freq}")
-
-    dataset = open_dataset_by_path(app.config['NETCDF_S2D_FORECAST_FILENAME_FORMATS'].format(
-        root=app.config['DATASETS_ROOT'],
-        var=var,
-        freq=freq
-    ))
-
-    latest_datetime = dataset['time'].min().values
-    return str(latest_datetime.astype('datetime64[D]'))
+    return _get_s2d_release(var, freq)[0]
@@ -10,6 +10,27 @@ TEMPDIR = "/tmp"
 DATASETS_ROOT = Path("./datasets")
 CACHE_FOLDER = Path("./cache")
 
+# Maximum number of opened datasets kept per worker (0 disables the cache)
+DATASET_CACHE_SIZE = 128
+# Delay (in seconds) after which the index of files in DATASETS_ROOT is rebuilt
+DATASET_INDEX_REFRESH_INTERVAL = 3600
+# Number of lat/lon cells in each chunk of the datasets rechunked for point access (see `flask rechunk-point-datasets`)
+POINT_CHUNK_SIZE = 16
+# Maximum number of generate-charts responses kept per worker (0 disables the cache)
+CHART_CACHE_SIZE = 2048
+# Write charts evicted from memory under CACHE_FOLDER/responses/charts
+CHART_CACHE_SPILL = False
+# Maximum number of get-choro-values responses kept per worker (0 disables the cache)
+CHORO_CACHE_SIZE = 4096
+# Write choropleth values evicted from memory or precomputed by "flask warm-choro-cache" under
+# CACHE_FOLDER/responses/choro. Each evicted value is pickled to a file, so enable it with a CHORO_CACHE_SIZE large
+# enough to avoid constant evictions. Must be enabled for "flask warm-choro-cache"
+CHORO_CACHE_SPILL = False
+# Number of threads per worker reading datasets concurrently for a request (1 reads them sequentially)
+IO_WORKERS = 8
+# Maximum number of charts generated concurrently by a generate-charts-batch request
+CHART_BATCH_WORKERS = 4
+
 FILENAME_FORMATS = {
     'ANUSPLIN_v1': {
         'allyears': ["nrcan_canada_1950-2013_{var}_{freq}.nc"],
@@ -47,6 +68,10 @@ OBSERVATIONS_DATASET = {
 
 GRIDS = {'canadagrid': 'shapefiles/canadagrid/canadagrid.shp',
          '1degreegrid': 'shapefiles/1degreegrid/1degreegrid.shp'}
+# Nearest cell lookup of the grids in get-gids: 'lattice' computes the cells of regular grids from their origin and
+# step, 'kdtree' (the default for grids not listed) queries a kd-tree of the centroids
+GRID_LOOKUP_ENGINES = {'canadagrid': 'lattice',
+                       '1degreegrid': 'lattice'}
 
 NETCDF_SPEI_FILENAME_FORMATS = "{root}/SPEI/{var}/SPEI_ensemble_percentiles_allrcps_MON_1900_2100_{var}.nc"
 NETCDF_SPEI_OBSERVED_FILENAME_FORMATS = "{root}/SPEI/{var}/CCRC_CANGRD_MON_1900_2014_spei_bc_ref_period_195001_200512_timev_{var}.nc"
@@ -57,6 +82,13 @@ NETCDF_SLR_CMIP6_PATH = "{root}/sealevel/Decadal_CMIP6_ensemble-percentiles_alls
 
 NETCDF_ALLOWANCE_PATH =  "{root}/allowance/Decadal_CMIP6_median_allssps_2020-2150_allowance_YS.nc"
 
+# Small datasets read on every location page, held entirely in memory by the dataset cache so that requests to them
+# don't read the file
+PRELOAD_DATASETS = [NETCDF_SLR_CMIP5_PATH, NETCDF_SLR_ENHANCED_PATH, NETCDF_SLR_CMIP6_PATH, NETCDF_ALLOWANCE_PATH]
+# Datasets of PRELOAD_DATASETS larger than this number of bytes in memory are not preloaded (0 disables preloading).
+# Preloaded datasets stay in each worker's memory, so their total must stay well under the reload-on-rss of uwsgi.ini
+PRELOAD_DATASET_MAX_SIZE = 32 * 1024 * 1024
+
 NETCDF_S2D_FORECAST_FILENAME_FORMATS = "{root}/s2d/data/forecast/{var}/s2d-forecast-{var}-{freq}-data.nc"
 NETCDF_S2D_CLIMATOLOGY_FILENAME_FORMATS = "{root}/s2d/data/climatology/{var}/s2d-climatology-{var}-{freq}-data.nc"
 NETCDF_S2D_SKILL_FILENAME_FORMATS = "{root}/s2d/data/skill/{var}/s2d-skill-{var}-{freq}-rel_to_{ref_period}-data.nc"
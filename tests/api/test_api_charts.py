@@ -42,6 +42,16 @@ from tests.configs import TEST_HOST_URL
             200,
             id="generate_regional_charts_cmip6",
         ),
+        pytest.param(
+            f"{TEST_HOST_URL}/generate-charts-batch/60.31062731740045/-100.06347656250001?charts=tx_max:ann,prcptot:jan&dataset_name=CMIP6",
+            200,
+            id="generate_charts_batch",
+        ),
+        pytest.param(
+            f"{TEST_HOST_URL}/generate-charts-batch/60.31062731740045/-100.06347656250001?charts=tx_max:foo",
+            400,
+            id="generate_charts_batch_invalid_month",
+        ),
     ],
 )
 def test_api_charts(url: str, status_code: int):
@@ -17,6 +17,21 @@ from tests.configs import TEST_HOST_URL
             200,
             id="get_choro_values_cmip6",
         ),
+        pytest.param(
+            f"{TEST_HOST_URL}/get-choro-values/census/tx_max/rcp85/ann/?period=1971&format=bin",
+            200,
+            id="get_choro_values_bin",
+        ),
+        pytest.param(
+            f"{TEST_HOST_URL}/get-choro-values/census/tx_max/rcp85/ann/?period=1971&format=xml",
+            400,
+            id="get_choro_values_invalid_format",
+        ),
+        pytest.param(
+            f"{TEST_HOST_URL}/get-choro-values-periods/census/tx_max/ssp585/ann/?dataset_name=CMIP6&delta7100=true",
+            200,
+            id="get_choro_values_periods",
+        ),
         pytest.param(
             f"{TEST_HOST_URL}/get-delta-30y-gridded-values/60.31062731740045/-100.06347656250001/tx_max/ann?period=1951&decimals=2",
             200,
@@ -62,3 +77,31 @@ from tests.configs import TEST_HOST_URL
 def test_api_map(url: str, status_code: int):
     response = requests.get(url)
     assert response.status_code == status_code
+
+
+@pytest.mark.parametrize(
+    "url,status_code,payload",
+    [
+        pytest.param(
+            f"{TEST_HOST_URL}/get-delta-30y-gridded-values-batch/tx_max/ann?decimals=2",
+            200,
+            {"points": [[60.31062731740045, -100.06347656250001], [45.5, -73.56]], "periods": [1951, 2071]},
+            id="get_delta_30y_gridded_values_batch",
+        ),
+        pytest.param(
+            f"{TEST_HOST_URL}/get-delta-30y-gridded-values-batch/tx_max/ann?dataset_name=CMIP6&delta7100=true",
+            200,
+            {"points": [[60.31062731740045, -100.06347656250001]]},
+            id="get_delta_30y_gridded_values_batch_all_periods",
+        ),
+        pytest.param(
+            f"{TEST_HOST_URL}/get-delta-30y-gridded-values-batch/tx_max/ann",
+            400,
+            {"points": [[60.31062731740045, -100.06347656250001]], "periods": [1955]},
+            id="get_delta_30y_gridded_values_batch_invalid_period",
+        ),
+    ],
+)
+def test_api_map_post(url: str, status_code: int, payload):
+    response = requests.post(url, json=payload)
+    assert response.status_code == status_code
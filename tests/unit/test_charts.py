@@ -0,0 +1,109 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+import xarray as xr
+from werkzeug.exceptions import BadRequest
+
+from climatedata_api.charts import _CellSeries, _observations_30y_means, generate_charts, generate_charts_batch
+from climatedata_api.utils import refresh_dataset_index, select_month
+from default_settings import NETCDF_ALLOWANCE_PATH
+from tests.unit.utils import write_location_test_datasets
+
+
+class TestCellSeries:
+    def test_read_and_slice(self):
+        times = np.array(["1950-01-01", "1950-02-01", "2000-01-01", "2050-01-01"], dtype="datetime64[ns]")
+        location_slice = xr.Dataset(
+            data_vars={
+                "rcp85_tx_max_p10": ("time", np.array([1.0, np.nan, 3.0, 4.0], dtype=np.float32)),
+                "rcp85_tx_max_p90": ("time", [5.0, 6.0, 7.0, 8.0], {"units": "K"}),
+            },
+            coords={"time": times},
+        )
+        cell = _CellSeries(location_slice)
+
+        # time steps where any variable is missing are dropped, like dropna('time')
+        assert cell.values.shape == (2, 3)
+        assert "rcp85_tx_max_p90" in cell and cell.attrs["rcp85_tx_max_p90"] == {"units": "K"}
+        stop = cell.index("2000-01-01", side="right")
+        assert cell.to_list(["rcp85_tx_max_p10", "rcp85_tx_max_p90"], 1, stop=stop) == [
+            [-631152000000, 1.0, 5.0], [946684800000, 3.0, 7.0]]
+        assert cell.add(-1).to_dict(["rcp85_tx_max_p90"], 0, start=stop) == {2524608000000: [7]}
+
+        january = _CellSeries(select_month(location_slice, 1))
+        assert january.to_dict(["rcp85_tx_max_p90"], 1) == {
+            -631152000000: [5.0], 946684800000: [7.0], 2524608000000: [8.0]}
+
+
+class TestObservations30yMeans:
+    def test_same_as_rolling(self):
+        data = np.random.default_rng(0).normal(280, 20, 63).astype(np.float32)
+        observations = xr.Dataset(
+            data_vars={"tx_max": ("time", data)},
+            coords={"time": np.arange("1950", "2013", dtype="datetime64[Y]").astype("datetime64[ns]")},
+        )
+        expected = observations.rolling({"time": 30}).mean().dropna("time")
+        expected["time"] = observations.time[0:len(expected.time)]
+        expected = expected.sel(time=(expected.time.dt.year % 10 == 1))
+
+        timestamps, values = _observations_30y_means(observations)
+        assert timestamps.tolist() == [-599616000000, -283996800000, 31536000000, 347155200000]
+        assert np.array_equal(values[:, 0], expected["tx_max"].values)
+
+    def test_generic_path(self):
+        observations = xr.Dataset(
+            data_vars={"tx_max": ("time", [1.0, np.nan])},
+            coords={"time": np.array(["1951-01-01", "1952-01-01"], dtype="datetime64[ns]")},
+        )
+        assert _observations_30y_means(observations) is None
+
+
+class TestGenerateChartsBatch:
+    def test_same_as_single_charts(self, test_app, tmp_path):
+        test_app.config.update(DATASETS_ROOT=tmp_path / "datasets", CACHE_FOLDER=tmp_path / "cache")
+        write_location_test_datasets(tmp_path / "datasets")
+        refresh_dataset_index()
+
+        charts = [("tx_max", "ann"), ("slr", "ann"), ("allowance", "ann")]
+        query_string = {"dataset_name": "CMIP6", "charts": ",".join(f"{var}:{month}" for var, month in charts)}
+        with test_app.test_request_context(query_string=query_string):
+            batch = generate_charts_batch("46.1", "-73.4")
+
+        with test_app.test_request_context(query_string={"dataset_name": "CMIP6"}):
+            for var, month in charts:
+                assert batch[var][month] == generate_charts(var, "46.1", "-73.4", month)
+        assert list(batch["slr"]["ann"]) == ["ssp126_median", "ssp126_range", "ssp245_median", "ssp245_range",
+                                             "ssp370_median", "ssp370_range", "ssp585_median", "ssp585_range",
+                                             "ssp585lowConf", "ssp585highEnd", "uplift"]
+
+    def test_error_of_one_chart(self, test_app, tmp_path):
+        test_app.config.update(DATASETS_ROOT=tmp_path / "datasets", CACHE_FOLDER=tmp_path / "cache")
+        write_location_test_datasets(tmp_path / "datasets")
+        refresh_dataset_index()
+
+        # only the annual datasets exist, the other charts are still generated
+        with test_app.test_request_context(query_string={"dataset_name": "CMIP6",
+                                                         "charts": "tx_max:jan,slr:ann,tx_max:ann"}):
+            batch = generate_charts_batch("46.1", "-73.4")
+        assert batch["tx_max"]["jan"] == {"error": "Bad request"}
+        assert "ssp126_median" in batch["slr"]["ann"] and "ssp126_median" in batch["tx_max"]["ann"]
+
+    def test_exception_of_one_chart(self, test_app, tmp_path):
+        test_app.config.update(DATASETS_ROOT=tmp_path / "datasets", CACHE_FOLDER=tmp_path / "cache")
+        write_location_test_datasets(tmp_path / "datasets")
+        refresh_dataset_index()
+        # a corrupted file fails to open
+        Path(NETCDF_ALLOWANCE_PATH.format(root=tmp_path / "datasets")).write_bytes(b"corrupted")
+
+        with test_app.test_request_context(query_string={"dataset_name": "CMIP6", "charts": "allowance:ann,slr:ann"}):
+            with patch("climatedata_api.charts.capture_exception") as mock_capture:
+                batch = generate_charts_batch("46.1", "-73.4")
+        assert batch["allowance"]["ann"] == {"error": "Internal server error"}
+        assert mock_capture.call_count == 1
+        assert "ssp126_median" in batch["slr"]["ann"]
+
+        with test_app.test_request_context(query_string={"dataset_name": "CMIP6", "charts": "slr:ann"}):
+            with pytest.raises(BadRequest):
+                generate_charts_batch("nan", "-73.4")
@@ -1,16 +1,23 @@
 import numpy as np
+import pytest
 import xarray as xr
 from unittest.mock import patch
 import json
+import struct
 
-from climatedata_api.map import get_s2d_release_date, get_s2d_gridded_values
+from climatedata_api.map import (_choro_cache, _choro_values_to_bin, _choro_values_to_json, get_choro_values,
+                                 get_choro_values_periods, get_delta_30y_gridded_values,
+                                 get_delta_30y_gridded_values_batch,
+                                 get_id_list_from_points_post, get_s2d_release_date, get_s2d_gridded_values,
+                                 warm_choro_cache)
+from climatedata_api.utils import refresh_dataset_index
 from default_settings import (
     S2D_CLIMATO_DATA_VAR_NAMES,
     S2D_FORECAST_DATA_VAR_NAMES,
     S2D_FREQUENCY_SEASONAL,
     S2D_VARIABLE_AIR_TEMP,
 )
-from tests.unit.utils import generate_s2d_test_datasets
+from tests.unit.utils import generate_s2d_test_datasets, write_location_test_datasets
 
 
 class TestGetS2DReleaseDate:
@@ -150,3 +157,140 @@ class TestGetS2DGriddedValues:
             response, status = get_s2d_gridded_values(requested_lat, requested_lon, S2D_VARIABLE_AIR_TEMP, S2D_FREQUENCY_SEASONAL)
         assert status == 400
         assert isinstance(response, ValueError) and "not available in skill dataset" in str(response)
+
+
+class TestChoroValues:
+    @pytest.fixture
+    def partition_dataset(self, test_app, tmp_path):
+        test_app.config.update(DATASETS_ROOT=tmp_path, CHORO_CACHE_SIZE=0)
+        folder = tmp_path / "CMIP6" / "partitions" / "census" / "tx_max" / "YS"
+        folder.mkdir(parents=True)
+        xr.Dataset(
+            data_vars={"ssp585_tx_max_p50": (("time", "region"), np.array([[1.234, np.nan, -5.678], [2.0, 3.0, np.inf]]))},
+            coords={"time": np.array(["1971-01-01", "2071-01-01"], dtype="datetime64[ns]"), "region": [1, 2, 3]},
+        ).to_netcdf(folder / "tx_max_YS_MBCn+PCIC-Blend_historical_allrcps_spatialAvg_30y_Means_Ensemble_percentiles.nc")
+        refresh_dataset_index()
+
+    def test_vary_accept(self, test_app, partition_dataset):
+        query_string = {"dataset_name": "CMIP6", "period": 1971}
+        for headers, mimetype in [({}, "application/json"), ({"Accept": "application/octet-stream"},
+                                                              "application/octet-stream")]:
+            with test_app.test_request_context(query_string=query_string, headers=headers):
+                response = get_choro_values("census", "tx_max", "ssp585")
+            assert response.mimetype == mimetype
+            assert response.headers["Vary"] == "Accept"
+
+    def test_periods(self, test_app, partition_dataset):
+        with test_app.test_request_context(query_string={"dataset_name": "CMIP6"}):
+            response = get_choro_values_periods("census", "tx_max", "ssp585")
+        # NaN is replaced by 0, but infinite values are kept like in get-choro-values
+        assert json.loads(response.get_data()) == {"periods": [1971, 2071],
+                                                   "values": [[1.23, 0, -5.68], [2.0, 3.0, float("inf")]]}
+
+    def test_warm_cache(self, test_app, tmp_path, partition_dataset):
+        test_app.config.update(CACHE_FOLDER=tmp_path / "cache", CHORO_CACHE_SIZE=10, CHORO_CACHE_SPILL=True)
+        _choro_cache.clear()
+        warm_choro_cache()
+
+        # ssp585_tx_max_p50 for 2 periods, in both formats
+        spill_folder = tmp_path / "cache" / "responses" / "choro"
+        files = {path: path.stat().st_mtime_ns for path in spill_folder.iterdir()}
+        assert len(files) == 4
+        with test_app.test_request_context(query_string={"dataset_name": "CMIP6", "period": 2071}):
+            with patch("climatedata_api.map._choro_values_to_json", side_effect=AssertionError("not precomputed")):
+                response = get_choro_values("census", "tx_max", "ssp585")
+        assert json.loads(response.get_data()) == [2.0, 3.0, float("inf")]
+
+        # up to date values are not computed again
+        warm_choro_cache()
+        assert {path: path.stat().st_mtime_ns for path in spill_folder.iterdir()} == files
+
+    def test_bin_same_as_json(self):
+        dataset = xr.Dataset(
+            data_vars={"rcp85_tx_max_p50": (("time", "region"), np.array([[1.234, np.nan, -5.678]], dtype=np.float32))},
+            coords={"time": np.array(["1971-01-01"], dtype="datetime64[ns]"), "region": [3, 1, 2]},
+        )
+        assert json.loads(_choro_values_to_json(dataset, "rcp85_tx_max_p50", 1971, 1, 2)) == [1.23, 0, -5.68]
+
+        values = _choro_values_to_bin(dataset, "rcp85_tx_max_p50", 1971, 1, 2)
+        count, nodata, scale = struct.unpack("<Iff", values[:12])
+        assert count == 3 and np.isnan(nodata) and np.isclose(scale, 0.01)
+        assert np.array_equal(np.frombuffer(values, "<f4", offset=12), np.array([1.23, np.nan, -5.68], dtype=np.float32),
+                              equal_nan=True)
+
+
+class TestGetIdListFromPointsPost:
+    @pytest.fixture(autouse=True)
+    def grid(self, test_app, tmp_path):
+        test_app.config.update(CACHE_FOLDER=tmp_path, GRIDS={"testgrid": "grid.shp"})
+        np.save(tmp_path / "kdtree-testgrid.npy", np.array([[45.5, -73.5], [45.5, -72.5], [46.5, -73.5]]))
+
+    def test_compressed(self, test_app):
+        # (45.6, -73.4), (46.4, -73.6)
+        with test_app.test_request_context(method="POST", query_string={"gridname": "testgrid"}, data="kqjjuI8yT"):
+            assert get_id_list_from_points_post() == [0, 2]
+
+    def test_binary(self, test_app):
+        points = np.array([[45.6, -72.6], [60.0, -60.0]], dtype="<f4").tobytes()
+        with test_app.test_request_context(method="POST", query_string={"gridname": "testgrid", "format": "bin"},
+                                           data=points, content_type="application/octet-stream"):
+            result = get_id_list_from_points_post()
+        assert result.mimetype == "application/octet-stream"
+        assert np.frombuffer(result.get_data(), "<i4").tolist() == [1, 3]
+
+    @patch("climatedata_api.map.capture_message")
+    def test_unmatched(self, mock_capture_message, test_app):
+        points = np.array([[45.6, -72.6]] + [[60.0, -60.0 - i] for i in range(10)], dtype="<f4").tobytes()
+        with test_app.test_request_context(method="POST", query_string={"gridname": "testgrid"}, data=points,
+                                           content_type="application/octet-stream"):
+            assert get_id_list_from_points_post() == [1] + [3] * 10
+
+        # only a summary of the points is sent
+        mock_capture_message.assert_called_once()
+        extras = mock_capture_message.call_args.kwargs["extras"]
+        assert extras["points_count"] == 11 and extras["unmatched_count"] == 10
+        assert extras["unmatched_points"] == [[60.0, -60.0 - i] for i in range(5)]
+
+    def test_invalid(self, test_app):
+        with test_app.test_request_context(method="POST", query_string={"gridname": "testgrid"}, data=b"abc",
+                                           content_type="application/octet-stream"):
+            assert get_id_list_from_points_post() == ("Bad request", 400)
+
+
+class TestGetDelta30yGriddedValuesBatch:
+    @pytest.fixture(autouse=True)
+    def datasets(self, test_app, tmp_path):
+        test_app.config.update(DATASETS_ROOT=tmp_path / "datasets", CACHE_FOLDER=tmp_path / "cache")
+        write_location_test_datasets(tmp_path / "datasets")
+        refresh_dataset_index()
+
+    @pytest.mark.parametrize("delta7100", ["false", "true"])
+    def test_same_as_single_points(self, test_app, delta7100):
+        # points sharing grid rows and cells, in any order
+        points = [[46.1, -73.4], [45.2, -74.9], [46.1, -72.1], [47.9, -73.4], [46.05, -73.45], [46.1, -74.9]]
+        query_string = {"dataset_name": "CMIP6", "decimals": 3, "delta7100": delta7100}
+        with test_app.test_request_context(method="POST", query_string=query_string,
+                                           json={"points": points, "periods": [2071, 1951]}):
+            batch = get_delta_30y_gridded_values_batch("tx_max", "ann")
+
+        assert len(batch) == len(points)
+        for (lat, lon), point_values in zip(points, batch):
+            assert list(point_values) == [2071, 1951]
+            for period, values in point_values.items():
+                with test_app.test_request_context(query_string={**query_string, "period": period}):
+                    assert values == get_delta_30y_gridded_values(str(lat), str(lon), "tx_max", "ann")
+
+    def test_too_many_points(self, test_app):
+        test_app.config["DOWNLOAD_POINTS_LIMIT"] = 2
+        with test_app.test_request_context(method="POST", query_string={"dataset_name": "CMIP6"},
+                                           json={"points": [[46.1, -73.4]] * 3}):
+            assert get_delta_30y_gridded_values_batch("tx_max", "ann") == ("Bad request: too many points requested",
+                                                                           400)
+
+    @pytest.mark.parametrize("points", [[60.3, -100.0, 45.5, -73.5], [[60.3, -100.0, 1.0]], [[float("nan"), -100.0]],
+                                        [[60.3, float("inf")]], [[[60.3, -100.0]]]])
+    def test_invalid_points(self, test_app, points):
+        with test_app.test_request_context(method="POST", query_string={"dataset_name": "CMIP6"},
+                                           json={"points": points}):
+            assert get_delta_30y_gridded_values_batch("tx_max", "ann") == (
+                "Bad request: points must be a list of [lat, lon] numbers", 400)
@@ -0,0 +1,479 @@
+import datetime
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import xarray as xr
+from flask import current_app as app
+from shapely.geometry import box
+from werkzeug.exceptions import BadRequest
+
+from climatedata_api import utils
+from climatedata_api.utils import (GridAxis, GridLookup, ResponseCache, build_catalog, check_catalog,
+                                   clear_dataset_cache, convert_time_series_dataset_to_dict,
+                                   convert_time_series_dataset_to_list, decode_compressed_points, generate_kdtrees,
+                                   get_catalog_entry, get_dataset_path, get_grid_cell, get_grid_lookup,
+                                   get_point_dataset_path, get_points_mask, get_s2d_datasets,
+                                   load_s2d_datasets_by_periods, open_dataset, open_dataset_by_path,
+                                   rechunk_point_datasets, refresh_dataset_index, regrid_s2d_forecast,
+                                   retrieve_s2d_release_date, run_io_tasks, select_month, select_nearest_point)
+from tests.unit.utils import generate_s2d_test_datasets
+
+
+def write_test_dataset(path, value):
+    dataset = xr.Dataset(
+        data_vars={"tx_max": (("time", "lat", "lon"), np.full((3, 2, 2), value, dtype=np.float32))},
+        coords={
+            "time": ("time", [0, 365, 730], {"units": "days since 2000-01-01"}),
+            "lat": [45.0, 46.0],
+            "lon": [-74.0, -73.0],
+        },
+    )
+    dataset.to_netcdf(path)
+
+
+class TestDatasetCache:
+    @pytest.fixture(autouse=True)
+    def empty_cache(self, test_app):
+        clear_dataset_cache()
+        yield
+        clear_dataset_cache()
+
+    def test_reuse_and_close(self, test_app, tmp_path):
+        path = tmp_path / "test.nc"
+        write_test_dataset(path, 1.0)
+
+        first = open_dataset_by_path(path)
+        assert first.time.dt.year.values.tolist() == [2000, 2000, 2001]
+        first.close()
+
+        second = open_dataset_by_path(path)
+        assert len(utils._dataset_cache) == 1
+        # closing the first copy must not affect the shared handle
+        assert second["tx_max"].values.sum() == 12.0
+
+    def test_reload_on_change(self, test_app, tmp_path):
+        path = tmp_path / "test.nc"
+        write_test_dataset(path, 1.0)
+        assert open_dataset_by_path(path)["tx_max"].values.sum() == 12.0
+
+        os.remove(path)
+        write_test_dataset(path, 2.0)
+        os.utime(path, ns=(0, 0))
+        assert open_dataset_by_path(path)["tx_max"].values.sum() == 24.0
+
+    def test_eviction(self, test_app, tmp_path):
+        test_app.config["DATASET_CACHE_SIZE"] = 2
+        for i in range(3):
+            write_test_dataset(tmp_path / f"test{i}.nc", float(i))
+            open_dataset_by_path(tmp_path / f"test{i}.nc")
+        assert list(utils._dataset_cache) == [str(tmp_path / "test1.nc"), str(tmp_path / "test2.nc")]
+
+    def test_missing_file(self, test_app, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            open_dataset_by_path(tmp_path / "missing.nc")
+
+    def test_preload(self, test_app, tmp_path):
+        write_test_dataset(tmp_path / "small.nc", 1.0)
+        write_test_dataset(tmp_path / "large.nc", 1.0)
+        write_test_dataset(tmp_path / "other.nc", 1.0)
+        test_app.config.update(DATASETS_ROOT=tmp_path, PRELOAD_DATASETS=["{root}/small.nc", "{root}/large.nc"],
+                               PRELOAD_DATASET_MAX_SIZE=1024)
+        assert open_dataset_by_path(tmp_path / "small.nc")["tx_max"].variable._in_memory
+        # only the listed datasets are preloaded
+        assert not open_dataset_by_path(tmp_path / "other.nc")["tx_max"].variable._in_memory
+        test_app.config["PRELOAD_DATASET_MAX_SIZE"] = 0
+        assert not open_dataset_by_path(tmp_path / "large.nc")["tx_max"].variable._in_memory
+
+
+class TestDatasetIndex:
+    @pytest.fixture
+    def datasets_root(self, test_app, tmp_path):
+        test_app.config["DATASETS_ROOT"] = tmp_path
+        folder = tmp_path / "CMIP6" / "allyears" / "tx_max" / "MS"
+        folder.mkdir(parents=True)
+        # only the second filename format exists for this variable
+        write_test_dataset(folder / "tx_max_MS_BCCAQ2v2+ANUSPLIN300_historical+allssps_1950-2100_AllYears_percentiles_01January.nc", 1.0)
+        folder = tmp_path / "ANUSPLIN_v1" / "allyears" / "tx_max" / "MS"
+        folder.mkdir(parents=True)
+        write_test_dataset(folder / "nrcan_canada_1950-2013_tx_max_MS.nc", 1.0)
+        folder = tmp_path / "CMIP6" / "partitions" / "census" / "tx_max" / "YS"
+        folder.mkdir(parents=True)
+        write_test_dataset(folder / "tx_max_YS_MBCn+PCIC-Blend_historical_allrcps_spatialAvg_30y_Means_Ensemble_percentiles.nc", 1.0)
+        refresh_dataset_index()
+        return tmp_path
+
+    def test_resolve(self, datasets_root):
+        assert get_dataset_path("CMIP6", "allyears", "tx_max", "MS", "_01January") == (
+            datasets_root / "CMIP6" / "allyears" / "tx_max" / "MS" /
+            "tx_max_MS_BCCAQ2v2+ANUSPLIN300_historical+allssps_1950-2100_AllYears_percentiles_01January.nc")
+        # formats without {period} match any requested period
+        assert get_dataset_path("ANUSPLIN_v1", "allyears", "tx_max", "MS", "_02February") == (
+            datasets_root / "ANUSPLIN_v1" / "allyears" / "tx_max" / "MS" / "nrcan_canada_1950-2013_tx_max_MS.nc")
+        assert get_dataset_path("CMIP6", "30ymeans", "tx_max", "YS", partition="census") is not None
+
+    def test_unknown(self, datasets_root):
+        assert get_dataset_path("CMIP6", "allyears", "tx_max", "MS", "_02February") is None
+        assert get_dataset_path("CMIP6", "30ygraph", "tx_max", "MS", "_01January") is None
+        assert get_dataset_path("CMIP6", "30ymeans", "tx_max", "YS", partition="health") is None
+        with pytest.raises(FileNotFoundError):
+            open_dataset("CMIP5", "allyears", "tx_max", "MS", "_01January")
+
+    def test_unknown_without_filesystem(self, datasets_root):
+        with patch("os.stat", side_effect=AssertionError("filesystem call")), \
+                patch("os.scandir", side_effect=AssertionError("filesystem call")):
+            assert get_dataset_path("CMIP5", "allyears", "tx_max", "MS", "_01January") is None
+            assert get_dataset_path("CMIP6", "30ymeans", "tx_max", "YS", partition="health") is None
+
+    def test_added_files(self, test_app, datasets_root):
+        # files added after the index was built are found once it is refreshed
+        folder = datasets_root / "CMIP6" / "partitions" / "health" / "tx_max" / "YS"
+        folder.mkdir(parents=True)
+        write_test_dataset(folder / "tx_max_YS_MBCn_ERA5-Land_historical_allrcps_spatialAvg_30y_Means_Ensemble_percentiles.nc", 1.0)
+        assert get_dataset_path("CMIP6", "30ymeans", "tx_max", "YS", partition="health") is None
+        refresh_dataset_index()
+        assert get_dataset_path("CMIP6", "30ymeans", "tx_max", "YS", partition="health") == (
+            folder / "tx_max_YS_MBCn_ERA5-Land_historical_allrcps_spatialAvg_30y_Means_Ensemble_percentiles.nc")
+
+        # an expired index is rebuilt in the background, the current index is used in the meantime
+        built = utils._dataset_index["built"]
+        test_app.config["DATASET_INDEX_REFRESH_INTERVAL"] = 0
+        assert get_dataset_path("CMIP6", "30ymeans", "tx_max", "YS", partition="census") is not None
+        with utils._dataset_index_build_lock:
+            assert utils._dataset_index["built"] > built
+
+
+class TestCatalog:
+    def test_build_and_check(self, test_app, tmp_path):
+        test_app.config["DATASETS_ROOT"] = tmp_path / "datasets"
+        test_app.config["CACHE_FOLDER"] = tmp_path / "cache"
+        folder = tmp_path / "datasets" / "CMIP6" / "30ygraph" / "tx_max" / "YS"
+        folder.mkdir(parents=True)
+        path = folder / "tx_max_YS_MBCn+PCIC-Blend_historical+allssps_1950-2100_30yGraph_percentiles.nc"
+        write_test_dataset(path, 1.0)
+        (folder / "README.txt").write_text("not a dataset")
+
+        build_catalog()
+
+        entry = get_catalog_entry(path)
+        assert entry["time"] == ["2000-01-01", "2000-12-31", "2001-12-31"]
+        assert entry["coords"]["lat"] == {"min": 45.0, "max": 46.0, "size": 2}
+        assert entry["variables"]["tx_max"]["dims"] == ["time", "lat", "lon"]
+        assert check_catalog(path, variables=["tx_max"], times=["2000-01-01"]) is entry
+
+        with pytest.raises(ValueError, match="variable ssp585_tx_max_p50 not available"):
+            check_catalog(path, variables=["ssp585_tx_max_p50"])
+        with pytest.raises(ValueError, match="period 2071-01-01 not available"):
+            check_catalog(path, times=["2071-01-01"])
+
+        # datasets missing from the catalog are not validated
+        assert check_catalog(folder / "other.nc", variables=["tx_max"]) is None
+
+
+class TestGridAxis:
+    @pytest.mark.parametrize("coords", [
+        np.round(np.arange(41.0, 83.5, 1 / 12), 6),  # regular, rounded
+        np.arange(-141, -52, 1 / 12).astype(np.float32),
+        np.linspace(40, 80, 481)[::-1],  # decreasing
+        np.sort(np.random.default_rng(0).uniform(0, 10, 50)),  # irregular
+        np.array([3.0]),
+    ])
+    def test_same_as_sel_nearest(self, coords):
+        values = np.concatenate([
+            np.random.default_rng(1).uniform(coords.min() - 3, coords.max() + 3, 500),
+            coords,
+            (coords[:-1].astype(np.float64) + coords[1:]) / 2,  # ties
+        ])
+        data = xr.DataArray(np.arange(coords.size), coords={"lat": coords}, dims="lat")
+        expected = [data.sel(lat=value, method="nearest").item() for value in values]
+
+        axis = GridAxis(coords)
+        assert [axis.nearest_index(float(value)) for value in values] == expected
+        assert axis.nearest(values.astype(coords.dtype)).tolist() == data.sel(lat=values, method="nearest").values.tolist()
+
+    def test_select_nearest_point(self):
+        dataset = xr.Dataset(
+            data_vars={"tx_max": (("lat", "lon"), np.arange(12.0).reshape(3, 4))},
+            coords={"lat": [45.0, 45.5, 46.0], "lon": [-74.0, -73.5, -73.0, -72.5]},
+        )
+        for lat, lon in [(45.3, -72.0), (44.0, -73.7), (45.75, -73.25)]:
+            assert select_nearest_point(dataset, lat, lon).identical(dataset.sel(lat=lat, lon=lon, method="nearest"))
+
+    @pytest.mark.parametrize("lat,lon", [(np.nan, -73.5), (45.5, np.nan), (np.inf, -73.5), (45.5, -np.inf)])
+    def test_non_finite_coordinates(self, lat, lon):
+        dataset = xr.Dataset(
+            data_vars={"tx_max": (("lat", "lon"), np.arange(12.0).reshape(3, 4))},
+            coords={"lat": [45.0, 45.5, 46.0], "lon": [-74.0, -73.5, -73.0, -72.5]},
+        )
+        with pytest.raises(BadRequest):
+            select_nearest_point(dataset, lat, lon)
+        with pytest.raises(BadRequest):
+            get_grid_cell(dataset, lat, lon)
+        with pytest.raises(BadRequest):
+            get_points_mask(dataset, [(45.0, -74.0), (lat, lon)])
+
+
+class TestPointDatasets:
+    def test_rechunk(self, test_app, tmp_path):
+        test_app.config["DATASETS_ROOT"] = tmp_path / "datasets"
+        test_app.config["CACHE_FOLDER"] = tmp_path / "cache"
+        test_app.config["POINT_CHUNK_SIZE"] = 1
+        folder = tmp_path / "datasets" / "CMIP6" / "30ygraph" / "tx_max" / "YS"
+        folder.mkdir(parents=True)
+        path = folder / "tx_max_YS_MBCn+PCIC-Blend_historical+allssps_1950-2100_30yGraph_percentiles.nc"
+        write_test_dataset(path, 1.0)
+
+        assert get_point_dataset_path(path) == path
+        rechunk_point_datasets()
+        point_path = tmp_path / "cache" / "point_datasets" / path.relative_to(tmp_path / "datasets")
+        assert get_point_dataset_path(path) == point_path
+
+        point_dataset = open_dataset("CMIP6", "30ygraph", "tx_max", "YS", point_access=True)
+        assert point_dataset["tx_max"].encoding["chunksizes"] == (3, 1, 1)
+        assert point_dataset.identical(open_dataset("CMIP6", "30ygraph", "tx_max", "YS"))
+
+        # an outdated copy is not used
+        os.utime(point_path, ns=(0, 0))
+        assert get_point_dataset_path(path) == path
+
+
+class TestGridLookup:
+    def test_generate_and_reload(self, test_app, tmp_path):
+        test_app.config.update(DATASETS_ROOT=tmp_path, CACHE_FOLDER=tmp_path / "cache", GRIDS={"testgrid": "grid.shp"},
+                               GRID_LOOKUP_ENGINES={"testgrid": "lattice"})
+        cells = [box(x, y, x + 1, y + 1) for y in [45, 46] for x in [-74, -73]]
+        gpd.GeoDataFrame({"gid": range(4)}, geometry=cells).to_file(tmp_path / "grid.shp")
+        generate_kdtrees()
+        centroids_file = tmp_path / "cache" / "kdtree-testgrid.npy"
+        assert np.load(centroids_file).tolist() == [[45.5, -73.5], [45.5, -72.5], [46.5, -73.5], [46.5, -72.5]]
+        # unchanged shapefiles are skipped
+        os.utime(centroids_file, ns=(0, 0))
+        generate_kdtrees()
+        assert centroids_file.stat().st_mtime_ns == 0
+        generate_kdtrees(force=True)
+        assert centroids_file.stat().st_mtime_ns > 0
+
+        lookup = get_grid_lookup("testgrid")
+        assert get_grid_lookup("testgrid") is lookup and lookup.gids is not None
+        gids, matched = lookup.query([[46.6, -72.9], [45.2, -73.8], [50.0, -73.5]], distance_upper_bound=1.0)
+        assert gids.tolist() == [3, 0, 4] and matched.tolist() == [True, True, False]
+
+        np.save(centroids_file, np.array([[0.0, 0.0]]))
+        os.utime(centroids_file, ns=(0, 0))
+        assert get_grid_lookup("testgrid").tree.n == 1
+        with pytest.raises(KeyError):
+            get_grid_lookup("canadagrid")
+
+    def test_lattice_same_as_kdtree(self):
+        rng = np.random.default_rng(0)
+        lat, lon = np.meshgrid(50 + (np.arange(60) + 0.5) / 12, -110 + (np.arange(80) + 0.5) / 12, indexing="ij")
+        centroids = np.stack([lat.ravel(), lon.ravel()], axis=1)
+        # missing cells, like the ocean
+        centroids = centroids[rng.random(len(centroids)) > 0.3]
+        # points rounded like the compressed points, many of them on cell borders
+        points = np.round(np.stack([rng.uniform(49, 56, 5000), rng.uniform(-111, -102, 5000)], axis=1), 2)
+
+        lattice = GridLookup(centroids, "lattice")
+        kdtree = GridLookup(centroids)
+        assert lattice.engine == "lattice" and kdtree.engine == "kdtree"
+        lattice_gids, lattice_matched = lattice.query(points, distance_upper_bound=0.1)
+        kdtree_gids, kdtree_matched = kdtree.query(points, distance_upper_bound=0.1)
+        assert np.array_equal(lattice_gids, kdtree_gids) and np.array_equal(lattice_matched, kdtree_matched)
+        assert not lattice_matched.all()
+
+    def test_lattice_fallback(self):
+        lat, lon = np.meshgrid(50 + np.arange(10) / 12, -110 + np.arange(10) / 12, indexing="ij")
+        centroids = np.stack([lat.ravel(), lon.ravel()], axis=1)
+        irregular = centroids.copy()
+        irregular[0] += 0.02
+        for grid in [irregular, np.concatenate([centroids, centroids[:1]])]:
+            with pytest.warns(UserWarning, match="the kd-tree is used"):
+                lookup = GridLookup(grid, "lattice")
+            assert lookup.engine == "kdtree"
+
+
+class TestDecodeCompressedPoints:
+    def test_decode(self):
+        points = decode_compressed_points("-stivPu3IqgC0-J91gBs_RxxxCq8Dl5I41gBiv6Bv3ctqH75E16yBztY0vNt3KprlB70D")
+        assert points.shape == (20, 2)
+        assert points[:3].tolist() == [[59.26, -101.85], [59.1, -101.34], [59.31, -101.45]]
+        assert decode_compressed_points("").shape == (0, 2)
+
+    def test_invalid(self):
+        with pytest.raises(KeyError):
+            decode_compressed_points("ab$c")
+        with pytest.raises(ValueError):
+            decode_compressed_points("-" * 13 + "A")
+
+
+class TestResponseCache:
+    def test_signature_and_eviction(self, test_app):
+        test_app.config["TEST_CACHE_SIZE"] = 2
+        cache = ResponseCache("test", "TEST_CACHE_SIZE", "TEST_CACHE_SPILL")
+        cache.set("a", 1, "value a")
+        assert cache.get("a", 1) == "value a"
+        # a changed signature invalidates the entry
+        assert cache.get("a", 2) is None
+
+        for key in ["a", "b", "c"]:
+            cache.set(key, 1, f"value {key}")
+        assert cache.get("a", 1) is None
+        assert cache.get("c", 1) == "value c"
+
+    def test_spill(self, test_app, tmp_path):
+        test_app.config.update(CACHE_FOLDER=tmp_path, TEST_CACHE_SIZE=1, TEST_CACHE_SPILL=True)
+        cache = ResponseCache("test", "TEST_CACHE_SIZE", "TEST_CACHE_SPILL")
+        cache.set(("a", (1, 2)), 1, {1: [2.0]})
+        cache.set(("b", (1, 2)), 1, "value b")
+        assert len(list((tmp_path / "responses" / "test").iterdir())) == 1
+        assert cache.get(("a", (1, 2)), 1) == {1: [2.0]}
+        assert cache.get(("a", (1, 2)), 2) is None
+
+    def test_persist(self, test_app, tmp_path):
+        test_app.config.update(CACHE_FOLDER=tmp_path, TEST_CACHE_SIZE=1, TEST_CACHE_SPILL=True)
+        ResponseCache("test", "TEST_CACHE_SIZE", "TEST_CACHE_SPILL").persist("a", 1, b"[1.0]")
+        # entries written by another process are found on a miss
+        cache = ResponseCache("test", "TEST_CACHE_SIZE", "TEST_CACHE_SPILL")
+        assert cache.get("a", 1) == b"[1.0]"
+        assert cache.get("a", 2) is None
+
+
+class TestS2DDatasets:
+    def test_once_per_release(self, test_app, tmp_path):
+        clear_dataset_cache()
+        test_app.config["DATASETS_ROOT"] = tmp_path
+        forecast_ds, climato_ds, skill_ds = generate_s2d_test_datasets(
+            45, 46, -74, -73, ["2025-07-01", "2025-08-01"], ["1991-07-01", "1991-08-01"])
+        paths = {}
+        for dataset, kind, config_name in ((forecast_ds, "forecast", "NETCDF_S2D_FORECAST_FILENAME_FORMATS"),
+                                           (climato_ds, "climatology", "NETCDF_S2D_CLIMATOLOGY_FILENAME_FORMATS"),
+                                           (skill_ds, "skill", "NETCDF_S2D_SKILL_FILENAME_FORMATS")):
+            paths[kind] = test_app.config[config_name].format(root=tmp_path, var="air_temp", freq="monthly",
+                                                              ref_period="07")
+            os.makedirs(os.path.dirname(paths[kind]))
+            dataset.to_netcdf(paths[kind])
+
+        release_date, forecast, climatology, skill = get_s2d_datasets("air_temp", "monthly")
+        assert release_date == "2025-07-01" == retrieve_s2d_release_date("air_temp", "monthly")
+        assert get_s2d_datasets("air_temp", "monthly", 7)[1:] == (forecast, climatology, skill)
+        assert 7 in skill.time.dt.month.values
+
+        # a new release reopens all datasets
+        os.remove(paths["forecast"])
+        forecast_ds.assign_coords(time=np.array(["2025-08-01", "2025-09-01"], dtype="datetime64[ns]")).to_netcdf(
+            paths["forecast"])
+        os.utime(paths["forecast"], ns=(0, 0))
+        clear_dataset_cache()
+        assert retrieve_s2d_release_date("air_temp", "monthly") == "2025-08-01"
+        clear_dataset_cache()
+
+    def test_skill_opened_once(self, test_app):
+        release = ("2025-07-01", xr.Dataset(), xr.Dataset(), {})
+
+        def _open(path):
+            time.sleep(0.05)
+            return xr.Dataset(attrs={"path": path})
+
+        def _get():
+            with test_app.app_context():
+                return get_s2d_datasets("air_temp", "monthly")[3]
+
+        with patch("climatedata_api.utils._get_s2d_release", return_value=release), \
+                patch("climatedata_api.utils.open_dataset_by_path", side_effect=_open) as mock_open_dataset:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                skills = list(executor.map(lambda _: _get(), range(4)))
+        assert mock_open_dataset.call_count == 1
+        assert all(skill is release[3][7] for skill in skills)
+
+    def test_invalid(self, test_app):
+        with pytest.raises(ValueError):
+            get_s2d_datasets("tx_max", "monthly")
+
+    @patch("climatedata_api.utils.open_dataset_by_path")
+    def test_load_by_periods(self, mock_open_dataset, test_app):
+        forecast_ds, climato_ds, skill_ds = generate_s2d_test_datasets(
+            45, 46, -74, -73, ["2025-07-01", "2025-08-01", "2025-09-01"], ["1991-07-01", "1991-09-01"])
+        mock_open_dataset.side_effect = itertools.cycle([forecast_ds, climato_ds, skill_ds])
+        release = datetime.datetime(2025, 7, 1)
+
+        forecast, climatology, skill = load_s2d_datasets_by_periods(
+            "air_temp", "monthly", [datetime.datetime(2025, 9, 1), datetime.datetime(2025, 7, 1)], release)
+        assert forecast.time.dt.month.values.tolist() == [9, 7]
+        assert climatology.time.dt.strftime("%Y-%m").values.tolist() == ["1991-09", "1991-07"]
+        assert skill.time.dt.month.values.tolist() == [7, 9]
+
+        # all the missing periods are reported at once
+        with pytest.raises(ValueError, match="periods 2025-06-01 00:00:00, 2025-10-01 00:00:00 not available in "
+                                             "forecast dataset"):
+            load_s2d_datasets_by_periods("air_temp", "monthly", [datetime.datetime(2025, 6, 1),
+                                                                 datetime.datetime(2025, 7, 1),
+                                                                 datetime.datetime(2025, 10, 1)], release)
+        with pytest.raises(ValueError, match="period 2025-08-01 00:00:00 not available in skill dataset"):
+            load_s2d_datasets_by_periods("air_temp", "monthly", [datetime.datetime(2025, 8, 1)], release)
+
+    def test_regrid_same_as_interp(self):
+        forecast_ds, climato_ds, _ = generate_s2d_test_datasets(45.2, 50.0, -74.0, -70.3, ["2025-07-01"], [])
+        expected = forecast_ds.interp(lat=climato_ds["lat"], method="nearest", kwargs={"fill_value": "extrapolate"})
+        expected = expected.interp(lon=climato_ds["lon"], method="nearest", kwargs={"fill_value": "extrapolate"})
+
+        # includes climatology cells halfway between forecast cells and outside of the forecast grid
+        lats, lons = climato_ds["lat"].values[[0, 6, 7, 30]], climato_ds["lon"].values[-3:]
+        regridded = regrid_s2d_forecast(forecast_ds, climato_ds, lats, lons)
+        xr.testing.assert_identical(regridded, expected.sel(lat=lats, lon=lons))
+
+
+class TestConvertTimeSeries:
+    @pytest.fixture
+    def dataset(self):
+        return xr.Dataset(
+            data_vars={"p10": ("time", [1.234, np.nan, 3.0]), "p90": ("time", np.array([4.5, 5.25, -6.5], dtype=np.float32))},
+            coords={"time": np.array(["1950-01-01", "2000-02-01", "2100-12-01"], dtype="datetime64[ns]"), "lat": 45.0},
+        )
+
+    def test_list(self, dataset):
+        assert str(convert_time_series_dataset_to_list(dataset[["p10", "p90"]].drop_vars("lat"), 1)) == (
+            "[[-631152000000, 1.2, 4.5], [949363200000, nan, 5.2], [4131302400000, 3.0, -6.5]]")
+        assert convert_time_series_dataset_to_list(dataset["p90"].drop_vars("lat"), 0, year_offset=-1) == [
+            [-662688000000, 4], [917827200000, 5], [4099766400000, -6]]
+        # non-index coordinates are returned as columns, like DataFrame.to_dataframe
+        assert convert_time_series_dataset_to_list(dataset["p90"], 2)[0] == [-631152000000, 45.0, 4.5]
+
+    def test_dict(self, dataset):
+        assert convert_time_series_dataset_to_dict(dataset["p90"].drop_vars("lat"), 1, year_offset=1) == {
+            -599616000000: [4.5], 980985600000: [5.2], 4162838400000: [-6.5]}
+        with pytest.raises(ValueError):
+            convert_time_series_dataset_to_dict(dataset["p10"].drop_vars("lat"), 0)
+
+
+class TestRunIOTasks:
+    def test_results_in_order(self, test_app):
+        test_app.config["IO_WORKERS"] = 4
+        assert run_io_tasks(lambda: 1, lambda: app.config["IO_WORKERS"], lambda: 3) == [1, 4, 3]
+
+    def test_exception(self, test_app):
+        def _fail():
+            raise FileNotFoundError("missing")
+
+        with pytest.raises(FileNotFoundError, match="missing"):
+            run_io_tasks(lambda: 1, _fail)
+
+
+class TestSelectMonth:
+    def test_same_as_sel(self, test_app, tmp_path):
+        path = tmp_path / "monthly.nc"
+        xr.Dataset(
+            data_vars={"spei": ("time", np.arange(36.0))},
+            coords={"time": ("time", np.arange(36), {"units": "months since 2000-01-01", "calendar": "360_day"})},
+        ).to_netcdf(path)
+        dataset = xr.open_dataset(path)
+        for month in [1, 6, 12]:
+            expected = dataset.sel(time=(dataset.time.dt.month == month))
+            assert select_month(dataset, month).identical(expected)
+        assert utils.get_month_indices(dataset, 12).tolist() == [11, 23, 35]
+        # a dataset already subset in time doesn't use the indices of the file
+        assert select_month(dataset.isel(time=slice(12, None)), 1)["spei"].values.tolist() == [12.0, 24.0]
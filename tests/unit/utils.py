@@ -1,7 +1,11 @@
+from pathlib import Path
+
 import numpy as np
+import pandas as pd
 import xarray as xr
 
-from default_settings import S2D_FORECAST_DATA_VAR_NAMES, S2D_CLIMATO_DATA_VAR_NAMES
+from default_settings import (DELTA_NAMING, FILENAME_FORMATS, NETCDF_ALLOWANCE_PATH, NETCDF_SLR_CMIP6_PATH,
+                              OBSERVATIONS_DATASET, SCENARIOS, S2D_FORECAST_DATA_VAR_NAMES, S2D_CLIMATO_DATA_VAR_NAMES)
 
 
 def generate_s2d_test_datasets(lat_min: float,
@@ -121,3 +125,45 @@ def generate_coord_range(min_val: float, max_val: float) -> tuple[list[float], l
     high_res_range = np.round(high_res_range, 6)
 
     return forecast_range.tolist(), high_res_range.tolist()
+
+
+def write_location_test_datasets(root) -> None:
+    """
+    Write small CMIP6 datasets of the tx_max annual variable (all years, 30 years graph and observations), and of the sea
+    level rise and allowance variables, under a datasets root.
+    :param root: Path of the datasets root.
+    """
+    rng = np.random.default_rng(0)
+    coords = {"lat": np.arange(45.0, 48.1, 0.5), "lon": np.arange(-75.0, -71.9, 0.5)}
+
+    def write(path, times, variables, base, units="K"):
+        shape = (len(times), coords["lat"].size, coords["lon"].size)
+        dataset = xr.Dataset(
+            data_vars={v: (("time", "lat", "lon"), (base + rng.normal(0, 5, shape)).astype(np.float32), {"units": units})
+                       for v in variables},
+            coords={"time": pd.DatetimeIndex(times), **coords},
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        dataset.to_netcdf(path)
+
+    scenarios = SCENARIOS["CMIP6"]
+    percentiles = ["p10", "p50", "p90"]
+    write(root / "CMIP6" / "allyears" / "tx_max" / "YS" /
+          FILENAME_FORMATS["CMIP6"]["allyears"][0].format(var="tx_max", freq="YS", period=""),
+          pd.date_range("1950-01-01", "2100-01-01", freq="YS"),
+          [f"{s}_tx_max_{p}" for s in scenarios for p in percentiles], 280.0)
+    write(root / "CMIP6" / "30ygraph" / "tx_max" / "YS" /
+          FILENAME_FORMATS["CMIP6"]["30ygraph"][0].format(var="tx_max", freq="YS", period=""),
+          [f"{year}-01-01" for year in range(1951, 2072, 10)],
+          [f"{s}_tx_max_{d}{p}" for s in scenarios for d in ["", f"{DELTA_NAMING['CMIP6']}_"] for p in percentiles],
+          280.0)
+    observations = OBSERVATIONS_DATASET["CMIP6"]
+    write(root / observations / "allyears" / "tx_max" / "YS" /
+          FILENAME_FORMATS[observations]["allyears"][0].format(var="tx_max", freq="YS"),
+          pd.date_range("1950-01-01", "2012-01-01", freq="YS"), ["tx_max"], 280.0)
+
+    decades = pd.date_range("2020-01-01", "2150-01-01", freq="10YS")
+    slr_variables = [f"{s}_slr_{p}" for s in scenarios for p in ["p17", "p50", "p83"]]
+    write(Path(NETCDF_SLR_CMIP6_PATH.format(root=root)), decades,
+          slr_variables + ["ssp585lowConf_slr_p83", "ssp585highEnd_slr_p98", "uplift"], 10.0, "cm")
+    write(Path(NETCDF_ALLOWANCE_PATH.format(root=root)), decades, [f"{s}_allowance_p50" for s in scenarios], 10.0, "cm")